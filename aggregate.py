@@ -0,0 +1,175 @@
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import itertools
+import json
+import os
+import sys
+from scoring import kendall_w
+
+
+# Sums of the records of one poll, small enough to be sent between processes and merged in any order
+class PollTotals:
+    def __init__(self):
+        self.points = {}  # Variant name and its Borda points
+        self.level_points = {}  # Level index and the points of each variant in it
+        self.level_ballots = {}  # Level index and the number of rankings submitted for it
+        self.ballots = 0  # Number of level rankings
+        self.variant_count = 0
+        self.sessions = set()
+        self.voters = set()
+        self.seconds = 0
+
+    # Add one level ranking
+    def add(self, record):
+        order = record["order"]
+        level = record["level"]
+        self.variant_count = len(order)
+        level_points = self.level_points.setdefault(level, {})
+        for place, name in enumerate(order):
+            points = len(order) - 1 - place
+            self.points[name] = self.points.get(name, 0) + points
+            level_points[name] = level_points.get(name, 0) + points
+        self.level_ballots[level] = self.level_ballots.get(level, 0) + 1
+        self.ballots += 1
+        self.sessions.add(record["session"])
+        if record.get("voter"):
+            self.voters.add(record["voter"])
+        self.seconds += record.get("seconds", 0)
+
+    # Add the sums of other records of the same poll
+    def merge(self, other):
+        for name, points in other.points.items():
+            self.points[name] = self.points.get(name, 0) + points
+        for level, other_points in other.level_points.items():
+            level_points = self.level_points.setdefault(level, {})
+            for name, points in other_points.items():
+                level_points[name] = level_points.get(name, 0) + points
+        for level, ballots in other.level_ballots.items():
+            self.level_ballots[level] = self.level_ballots.get(level, 0) + ballots
+        self.ballots += other.ballots
+        self.variant_count = max(self.variant_count, other.variant_count)
+        self.sessions |= other.sessions
+        self.voters |= other.voters
+        self.seconds += other.seconds
+
+    # Scores of the poll: the same points as the ranking screen, the points of every level and the agreement between the rankings
+    def report(self):
+        return {
+            "ballots": self.ballots,
+            "sessions": len(self.sessions),
+            "voters": len(self.voters),
+            "mean_level_seconds": self.seconds / max(self.ballots, 1),
+            "points": sort_points(self.points),
+            "kendall_w": kendall_w(self.points, self.ballots, self.variant_count),
+            "levels": {
+                level: {
+                    "ballots": self.level_ballots[level],
+                    "points": sort_points(points),
+                    "kendall_w": kendall_w(
+                        points, self.level_ballots[level], self.variant_count
+                    ),
+                }
+                for level, points in sorted(self.level_points.items())
+            },
+        }
+
+
+# Variant names and their points, from the highest to the lowest score
+def sort_points(points):
+    return dict(sorted(points.items(), key=lambda item: -item[1]))
+
+
+# Read a group of session files line by line and return the totals of each poll. Runs on the worker processes
+def aggregate_files(paths):
+    polls = {}
+    errors = 0
+    for path in paths:
+        try:
+            with open(path, "rb") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                        totals = polls.get(record["poll"])
+                        if totals is None:
+                            totals = polls[record["poll"]] = PollTotals()
+                        totals.add(record)
+                    except (ValueError, KeyError, TypeError):
+                        errors += 1
+        except OSError:
+            errors += 1
+    return polls, errors
+
+
+# Session files given on the command line, looking for .jsonl files inside folders
+def session_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, filenames in os.walk(path):
+                for filename in filenames:
+                    if filename.endswith(".jsonl"):
+                        yield os.path.join(directory, filename)
+        else:
+            yield path
+
+
+# Groups of files, so the workers don't receive one task per file
+def shards(paths, shard_size):
+    shard = []
+    for path in paths:
+        shard.append(path)
+        if len(shard) == shard_size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+# Merge the totals of every session file, parsing them on a process pool.
+# At most two shards per worker are queued at a time, so the files of a big tree aren't all listed and sent to the workers up front
+def aggregate(paths, workers=None, shard_size=256):
+    polls = {}
+    errors = 0
+    window = 2 * (workers or os.cpu_count() or 1)
+    pending_shards = shards(session_files(paths), shard_size)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = set()
+        while True:
+            for shard in itertools.islice(pending_shards, window - len(futures)):
+                futures.add(executor.submit(aggregate_files, shard))
+            if not futures:
+                break
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                shard_polls, shard_errors = future.result()
+                errors += shard_errors
+                for poll, totals in shard_polls.items():
+                    if poll in polls:
+                        polls[poll].merge(totals)
+                    else:
+                        polls[poll] = totals
+    return {poll: totals.report() for poll, totals in polls.items()}, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Merge the results files of many sessions and print the scores of every poll as JSON"
+    )
+    parser.add_argument("paths", nargs="+", help="results files, or folders with .jsonl files")
+    parser.add_argument("--workers", type=int, help="number of processes (default: one per CPU)")
+    parser.add_argument("--shard-size", type=int, default=256, help="files parsed by each task")
+    parser.add_argument("--output", help="write the JSON to this file instead of stdout")
+    args = parser.parse_args()
+
+    polls, errors = aggregate(args.paths, args.workers, args.shard_size)
+    if errors:
+        print(f"Skipped {errors} unreadable file(s) or record(s)", file=sys.stderr)
+    output = json.dumps(polls, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
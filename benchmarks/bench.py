@@ -0,0 +1,296 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, features
+import PIL
+
+from engine import PollEngine, PollFolder, SpawnLayout, slot_resolution
+from loader import FolderValidator, ImagePyramid, prepare_level
+from tiles import TileCache, TiledImage, render_tile
+
+# Extension used for each format accepted by --formats
+FORMAT_EXTENSIONS = {"jpeg": ".jpg", "png": ".png", "tiff": ".tiff", "bmp": ".bmp", "webp": ".webp"}
+
+# Common resolutions that can be used by name in --resolutions
+NAMED_RESOLUTIONS = {"2MP": (1920, 1080), "12MP": (4000, 3000), "24MP": (6000, 4000), "45MP": (8192, 5464)}
+
+
+# Variant names with letters only, like the renamer requires: "VariantA", ..., "VariantZ", "VariantAA", ...
+def variant_names(count):
+    names = []
+    for length in itertools.count(1):
+        for letters in itertools.product(string.ascii_uppercase, repeat=length):
+            names.append("Variant" + "".join(letters))
+            if len(names) == count:
+                return names
+
+
+# Create a synthetic image with gradients and noise, so it doesn't compress like a flat color
+def synthetic_image(resolution, seed):
+    rng = random.Random(seed)
+    small = Image.new("RGB", (64, 64))
+    small.putdata(
+        [
+            (
+                (x * 4 + rng.randint(0, 40)) % 256,
+                (y * 4 + rng.randint(0, 40)) % 256,
+                (seed * 37 + rng.randint(0, 80)) % 256,
+            )
+            for y in range(64)
+            for x in range(64)
+        ]
+    )
+    image = small.resize(resolution, Image.BICUBIC)
+    noise = Image.effect_noise(resolution, 24).convert("RGB")
+    return Image.blend(image, noise, 0.15)
+
+
+# Create a folder in the "Variant<level>.ext" layout of the renamer.
+# Only unique_images different images are encoded per variant, the other levels are hard links to them, so big sweeps take almost no time or disk space
+def generate_folder(path, variants, levels, resolution, image_format="jpeg", unique_images=4):
+    os.makedirs(path, exist_ok=True)
+    extension = FORMAT_EXTENSIONS[image_format]
+    for variant_index, name in enumerate(variant_names(variants)):
+        encoded = []
+        for level in range(1, levels + 1):
+            filename = os.path.join(path, f"{name}{level}{extension}")
+            if len(encoded) < unique_images:
+                synthetic_image(resolution, variant_index * 1000 + level).save(
+                    filename, format=image_format.upper()
+                )
+                encoded.append(filename)
+            else:
+                link_or_copy(encoded[level % unique_images], filename)
+    return path
+
+
+# Hard link a file, copying it only where links aren't supported (like FAT drives or between devices)
+def link_or_copy(source, destination):
+    if os.path.lexists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+# Run a function the given number of times and return the time of each run in seconds
+def measure(function, repeat=1):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+# Slot and zoom resolution the poll would use on a screen of the given size.
+# The zoom fits the whole screen like Application.fit_full_resolution, which can be bigger than the original
+def poll_resolutions(image_resolution, variants, screen=(1920, 1080)):
+    slot = slot_resolution(screen[0], screen[1], variants, image_resolution)
+    gcd = math.gcd(*image_resolution)
+    aspect = (image_resolution[0] / gcd, image_resolution[1] / gcd)
+    bottleneck = min(screen[1] * aspect[0], screen[0] * aspect[1])
+    zoom = (max(math.floor(bottleneck / aspect[1]), 1), max(math.floor(bottleneck / aspect[0]), 1))
+    return slot, zoom
+
+
+# Time every phase of a poll over one folder. The image phases only use sample_levels levels, the engine phases use all of them
+def benchmark_folder(folder, variants, levels, resolution, sample_levels=3, repeat=3, seed=0):
+    rng = random.Random(seed)
+    slot, zoom = poll_resolutions(resolution, variants)
+    smaller_slot = (max(slot[0] * 3 // 4, 1), max(slot[1] * 3 // 4, 1))
+    results = {}
+
+    results["folder_scan"] = measure(lambda: PollFolder(folder, use_manifest=False), repeat)
+    poll_folder = PollFolder(folder)
+    results["folder_manifest"] = measure(lambda: PollFolder(folder), repeat)
+
+    def validate():
+        validator = FolderValidator(folder, poll_folder.filenames)
+        validator.start()
+        while not validator.finished():
+            time.sleep(0.001)
+
+    results["validation"] = measure(validate, repeat)
+
+    # Image phases on a sample of the levels
+    sampled = rng.sample(range(len(poll_folder.levels)), min(sample_levels, len(poll_folder.levels)))
+    prepared = []
+    spawn_times = []
+    for level_index in sampled:
+        start = time.perf_counter()
+        prepared.append(prepare_level(folder, poll_folder.levels[level_index], slot, None, zoom))
+        spawn_times.append(time.perf_counter() - start)
+    results["spawn_images"] = spawn_times
+
+    pyramids = [pyramid for level in prepared for pyramid in level.pyramids]
+    results["re_size"] = measure(
+        lambda: [pyramid.resize(smaller_slot) for pyramid in pyramids], repeat
+    )
+    lifted = (int(slot[0] * 1.1), int(slot[1] * 1.1))
+    results["mouse_click"] = [
+        time for pyramid in pyramids for time in measure(lambda: pyramid.resize(lifted), 1)
+    ]
+    results["full_image"] = [
+        time for pyramid in pyramids for time in measure(lambda: pyramid.resize(zoom), 1)
+    ]
+    # Deep zoom at one pixel of the screen for each pixel of the original: the first tile decodes the level (only around the tile for files without compression), the next one comes from the tile cache
+    zoom_tiles = []
+    cached_tiles = []
+    for pyramid in pyramids:
+        tiled = TiledImage(pyramid.path, TileCache())
+        columns, rows = tiled.grid(0)
+        zoom_tiles += measure(lambda: render_tile(tiled, 0, columns // 2, rows // 2, (512, 512)), 1)
+        cached_tiles += measure(
+            lambda: render_tile(tiled, 0, max(columns // 2 - 1, 0), rows // 2, (512, 512)), 1
+        )
+    results["zoom_tile"] = zoom_tiles
+    results["zoom_tile_cached"] = cached_tiles
+    # Decode without the zoom hint, like the loader did before the pyramids
+    results["full_decode"] = [
+        time
+        for filename in poll_folder.levels[sampled[0]]
+        for time in measure(
+            lambda: ImagePyramid(os.path.join(folder, filename)).build(), 1
+        )
+    ]
+
+    # Engine phases on every level
+    engine = PollEngine(poll_folder)
+
+    # Spawn layout of a level with the slot column of the poll, with a fixed seed so the runs are comparable
+    content_height = slot[1] * variants
+    results["spawn_layout"] = measure(
+        lambda: SpawnLayout(
+            [
+                (slot[0] / 2, slot[1] / 2, slot[0], content_height - slot[1] / 2),
+                (slot[0] * 3, slot[1] / 2, slot[0] * 3.5, content_height - slot[1] / 2),
+            ],
+            slot[1],
+            seed,
+        ).spawn(variants),
+        repeat,
+    )
+
+    def place_all():
+        for level_state in engine.levels:
+            order = list(range(variants))
+            rng.shuffle(order)
+            for variant in order:
+                level_state.place(variant, rng.randrange(variants))
+
+    results["mouse_release"] = measure(place_all, 1)
+    for level_index in range(len(engine.levels)):
+        engine.submit_level(level_index)
+    results["calculate_score"] = measure(engine.final_scores, repeat)
+    results["score_summary"] = measure(lambda: engine.summary(seed=seed), repeat)
+
+    placements = variants * len(engine.levels)
+    summary = {}
+    for phase, times in results.items():
+        summary[phase] = {
+            "runs": len(times),
+            "median_seconds": statistics.median(times),
+            "min_seconds": min(times),
+            "max_seconds": max(times),
+        }
+    summary["mouse_release"]["per_placement_seconds"] = (
+        summary["mouse_release"]["median_seconds"] / placements
+    )
+    return {"slot_resolution": slot, "zoom_resolution": zoom, "sampled_levels": sampled, "phases": summary}
+
+
+# Information to compare results across versions and machines
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "libjpeg_turbo": bool(features.check_feature("libjpeg_turbo")),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def parse_resolution(value):
+    if value in NAMED_RESOLUTIONS:
+        return NAMED_RESOLUTIONS[value]
+    width, height = value.lower().split("x")
+    return (int(width), int(height))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the poll phases on synthetic folders and print the results as JSON"
+    )
+    parser.add_argument("--variants", default="2,8", help="comma separated variant counts")
+    parser.add_argument("--levels", default="10", help="comma separated level counts")
+    parser.add_argument(
+        "--resolutions", default="2MP", help="comma separated WIDTHxHEIGHT or " + ", ".join(NAMED_RESOLUTIONS)
+    )
+    parser.add_argument("--formats", default="jpeg", help="comma separated " + ", ".join(FORMAT_EXTENSIONS))
+    parser.add_argument("--sample-levels", type=int, default=3, help="levels used for the image phases")
+    parser.add_argument("--unique-images", type=int, default=4, help="different images encoded per variant")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of the quick phases")
+    parser.add_argument("--folder-root", help="keep the generated folders here and reuse them")
+    parser.add_argument("--output", help="write the JSON to this file instead of stdout")
+    args = parser.parse_args()
+
+    folder_root = args.folder_root or tempfile.mkdtemp(prefix="image_vote_bench_")
+    runs = []
+    try:
+        for variants, levels, resolution, image_format in itertools.product(
+            [int(value) for value in args.variants.split(",")],
+            [int(value) for value in args.levels.split(",")],
+            [parse_resolution(value) for value in args.resolutions.split(",")],
+            args.formats.split(","),
+        ):
+            folder = os.path.join(
+                folder_root, f"{variants}v_{levels}l_{resolution[0]}x{resolution[1]}_{image_format}"
+            )
+            if not os.path.isdir(folder):
+                generate_folder(folder, variants, levels, resolution, image_format, args.unique_images)
+            print(f"{os.path.basename(folder)}...", file=sys.stderr)
+            result = benchmark_folder(folder, variants, levels, resolution, args.sample_levels, args.repeat)
+            result.update(
+                {"variants": variants, "levels": levels, "resolution": resolution, "format": image_format}
+            )
+            runs.append(result)
+    finally:
+        if not args.folder_root:
+            shutil.rmtree(folder_root, ignore_errors=True)
+
+    output = json.dumps({"environment": environment(), "runs": runs}, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,522 @@
+import json
+import math
+import os
+import random
+import re
+from scoring import PlackettLuce, RankMatrix, borda_points, score_summary
+from tracing import traced
+
+
+# Variant name and level number of a renamed file ("Variant<level>.ext"), or None if the name doesn't follow it
+def parse_filename(filename):
+    match = re.fullmatch(r"(.+?)(\d+)\.\w+", filename)
+    if not match:
+        return None
+    return match[1], int(match[2])
+
+
+# Key that sorts the numbers inside names by their value, so "A2" comes before "A10"
+def natural_key(name):
+    return [
+        (0, int(part), "") if part.isdigit() else (1, 0, part.lower())
+        for part in re.split(r"(\d+)", name)
+        if part
+    ]
+
+
+# Save a poll definition: a file with the variant names and the absolute path of the image of each variant in every level.
+# It can be opened instead of a folder of renamed images, so the images are used where they are
+def write_poll_definition(path, variant_names, variant_files):
+    definition = {
+        "version": PollFolder.definition_version,
+        "variants": list(variant_names),
+        "levels": [
+            [os.path.abspath(files[level]) for files in variant_files]
+            for level in range(len(variant_files[0]))
+        ],
+    }
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(definition, file)
+    os.replace(temp_path, path)
+
+
+# Variants and levels of a folder of renamed images ("Variant<level>.ext"), indexed in one pass over the file names.
+# The index is saved in a small manifest next to the folder, and reused while the modification time of the folder doesn't change, so big folders aren't listed and parsed again.
+# filepath can also be a poll definition file from write_poll_definition, whose levels have the paths of the images instead of file names
+class PollFolder:
+    manifest_version = 1
+    definition_version = 1
+
+    @traced("folder_scan", lambda self, filepath, filenames=None, use_manifest=True: {"files": len(self.filenames)})
+    def __init__(self, filepath, filenames=None, use_manifest=True):
+        self.filepath = filepath
+        self.manifest_path = os.path.normpath(filepath) + ".manifest.json"
+        self.variant_names = []  # Name of each variant, by variant index
+        self.levels = []  # List with the file of each variant, for every level
+        self.level_numbers = []  # Number in the file names of each level
+        self.gaps = {}  # Variant name and the level numbers missing for it
+        self.duplicates = []  # File names that share their variant and level with another file
+        self.unparsed = []  # File names that don't follow "Variant<level>.ext"
+        self.filenames = []  # Every indexed file, level by level
+
+        if os.path.isfile(filepath):
+            self.load_definition()
+            return
+        folder_mtime = os.stat(filepath).st_mtime_ns if filenames is None else None
+        if use_manifest and folder_mtime is not None and self.load_manifest(folder_mtime):
+            return
+        if filenames is None:
+            filenames = os.listdir(filepath)
+        self.index(filenames)
+        if use_manifest and folder_mtime is not None:
+            self.save_manifest(folder_mtime)
+
+    # Build the (variant, level) -> file table, finding gaps and duplicates in the same pass
+    def index(self, filenames):
+        table = {}  # Variant name and its level numbers with their file
+        for filename in filenames:
+            # Skip hidden files like ".DS_Store"
+            if filename.startswith("."):
+                continue
+            parsed = parse_filename(filename)
+            if parsed is None:
+                self.unparsed.append(filename)
+                continue
+            variant_levels = table.setdefault(parsed[0], {})
+            if parsed[1] in variant_levels:
+                if variant_levels[parsed[1]] not in self.duplicates:
+                    self.duplicates.append(variant_levels[parsed[1]])
+                self.duplicates.append(filename)
+            else:
+                variant_levels[parsed[1]] = filename
+
+        self.variant_names = sorted(table, key=natural_key)
+        self.level_numbers = sorted({level for levels in table.values() for level in levels})
+        for name in self.variant_names:
+            missing = [level for level in self.level_numbers if level not in table[name]]
+            if missing:
+                self.gaps[name] = missing
+        if not self.valid():
+            return
+        self.levels = [
+            [table[name][level] for name in self.variant_names]
+            for level in self.level_numbers
+        ]
+        self.filenames = [filename for level in self.levels for filename in level]
+
+    @property
+    def variant_count(self):
+        return len(self.variant_names) if self.valid() else 0
+
+    # Check if every variant has a file for every level, without duplicated or unknown files
+    def valid(self):
+        return (
+            bool(self.variant_names)
+            and not self.gaps
+            and not self.duplicates
+            and not self.unparsed
+        )
+
+    # Description of the problems of an invalid folder
+    def problems(self):
+        lines = []
+        if not self.variant_names:
+            lines.append("No renamed images found")
+        for name, missing in list(self.gaps.items())[:5]:
+            lines.append(f"{name} is missing level(s) {', '.join(map(str, missing[:10]))}")
+        if self.duplicates:
+            lines.append(f"Duplicated level(s): {', '.join(self.duplicates[:5])}")
+        if self.unparsed:
+            lines.append(f"Not renamed: {', '.join(self.unparsed[:5])}")
+        return lines
+
+    # Read the variants and levels of a poll definition. Relative paths are relative to the definition file
+    def load_definition(self):
+        with open(self.filepath, encoding="utf-8") as file:
+            definition = json.load(file)
+        if definition.get("version") != self.definition_version:
+            raise ValueError(f"Unknown poll definition version {definition.get('version')}")
+        self.variant_names = definition["variants"]
+        base = os.path.dirname(os.path.abspath(self.filepath))
+        self.levels = [
+            [os.path.join(base, path) for path in level] for level in definition["levels"]
+        ]
+        self.level_numbers = list(range(1, len(self.levels) + 1))
+        for level_number, level in zip(self.level_numbers, self.levels):
+            if len(level) != len(self.variant_names):
+                self.unparsed.append(f"level {level_number}")
+        if not self.levels:
+            self.variant_names = []
+        self.filenames = [path for level in self.levels for path in level]
+
+    # Read the saved index if it was made for the current state of the folder
+    def load_manifest(self, folder_mtime):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            return False
+        if (
+            manifest.get("version") != self.manifest_version
+            or manifest.get("folder_mtime_ns") != folder_mtime
+        ):
+            return False
+        self.variant_names = manifest["variant_names"]
+        self.levels = manifest["levels"]
+        self.level_numbers = manifest["level_numbers"]
+        self.gaps = manifest["gaps"]
+        self.duplicates = manifest["duplicates"]
+        self.unparsed = manifest["unparsed"]
+        self.filenames = [filename for level in self.levels for filename in level]
+        return True
+
+    # Save the index next to the folder. It is only an optimization, so it is skipped if the folder next to it is read-only
+    def save_manifest(self, folder_mtime):
+        manifest = {
+            "version": self.manifest_version,
+            "folder_mtime_ns": folder_mtime,
+            "variant_names": self.variant_names,
+            "levels": self.levels,
+            "level_numbers": self.level_numbers,
+            "gaps": self.gaps,
+            "duplicates": self.duplicates,
+            "unparsed": self.unparsed,
+        }
+        temp_path = self.manifest_path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(manifest, file)
+            os.replace(temp_path, self.manifest_path)
+        except OSError:
+            pass
+
+
+MIN_SLOT_HEIGHT = 100  # With many variants the slots keep this height and the level can be scrolled
+
+
+# Biggest image resolution that fits in the slots of a canvas with the given size, with the aspect ratio of base_resolution.
+# Used by the poll and by the thumbnail cache prewarm, so the prewarmed renditions are as big as the slots the poll asks for
+def slot_resolution(width, height, variant_count, base_resolution, min_slot_height=MIN_SLOT_HEIGHT):
+    gcd = math.gcd(base_resolution[0], base_resolution[1])
+    aspectratio = (base_resolution[0] / gcd, base_resolution[1] / gcd)
+    resvertical = min(max(height / variant_count, min_slot_height), base_resolution[1])
+    reshorizontal = min(width, base_resolution[0])
+    bottleneck = min(resvertical * aspectratio[0], reshorizontal * aspectratio[1])
+    return (
+        max(math.floor(bottleneck / aspectratio[1]), 1),
+        max(math.floor(bottleneck / aspectratio[0]), 1),
+    )
+
+
+# Slots of one level and the variant placed in each of them, from the top (highest score) to the bottom
+class LevelState:
+    def __init__(self, variant_count):
+        self.slots = [None] * variant_count  # Variant index in each slot, None if empty
+        self.variant_slots = {}  # Variant index and its slot, for the variants in a slot
+
+    # Slot of a variant, or None if it isn't in a slot
+    def slot_of(self, variant):
+        return self.variant_slots.get(variant)
+
+    # Take a variant out of its slot
+    def remove(self, variant):
+        slot = self.variant_slots.pop(variant, None)
+        if slot is not None:
+            self.slots[slot] = None
+
+    # Put a variant in a slot. If there already is a variant in it, the variants are shifted into the closest empty slot.
+    # The empty slots under the chosen slot have priority over the ones above it.
+    # Returns the variants that changed slot, including the placed one
+    def place(self, variant, slot):
+        self.remove(variant)
+        if self.slots[slot] is None:
+            self.slots[slot] = variant
+            self.variant_slots[variant] = slot
+            return [variant]
+
+        empty_slot = None
+        for slot_index in reversed(range(len(self.slots))):
+            if self.slots[slot_index] is None:
+                # If below, save the slot until a closer one is found
+                if slot_index > slot:
+                    empty_slot = slot_index
+                # If looking at slots above and an empty slot below has already been found, stop the loop
+                elif empty_slot is not None:
+                    break
+                # If no empty slots below, stop the loop on the first slot above
+                else:
+                    empty_slot = slot_index
+                    break
+
+        # Remove the empty slot and insert the variant, the variants between both slots move one slot towards the empty one
+        del self.slots[empty_slot]
+        self.slots.insert(slot, variant)
+        if empty_slot > slot:
+            shifted = range(slot + 1, empty_slot + 1)
+        else:
+            shifted = range(empty_slot, slot)
+        moved = [variant]
+        self.variant_slots[variant] = slot
+        for slot_index in shifted:
+            self.variant_slots[self.slots[slot_index]] = slot_index
+            moved.append(self.slots[slot_index])
+        return moved
+
+    # Check if every slot has a variant
+    def complete(self):
+        return None not in self.slots
+
+    # Variants from the first to the last place
+    def ranking(self):
+        return list(self.slots)
+
+
+# Position of the slots of a level, stacked in a column from the top of the canvas
+class SlotGeometry:
+    def __init__(self, slot_count, center_x, slot_height):
+        self.slot_count = slot_count
+        self.center_x = center_x  # Horizontal center of the column
+        self.slot_height = slot_height
+
+    # Center coordinates of a slot
+    def center(self, slot):
+        return (self.center_x, self.slot_height * slot + self.slot_height / 2)
+
+    # Slot whose center is the closest to a vertical coordinate
+    def slot_at(self, y):
+        return min(max(math.floor(y / self.slot_height), 0), self.slot_count - 1)
+
+    # Slot an image at the coordinates snaps into, or None if it isn't closer than one slot height to the closest center
+    def snap(self, x, y):
+        slot = self.slot_at(y)
+        if math.dist(self.center(slot), (x, y)) < self.slot_height:
+            return slot
+        return None
+
+
+# Random spawn points for the images of a level, at least min_distance apart when there is room for them.
+# Every point takes a bounded number of tries, checked against nearby points only through a spatial hash. When none of the tries is far enough from the other points, the one farthest from them is used, so the images overlap instead of the layout never ending.
+# regions are rectangles (left, top, right, bottom) picked with a chance proportional to their area. The same seed gives the same layout
+class SpawnLayout:
+    def __init__(self, regions, min_distance, seed=None, tries=30):
+        self.regions = [
+            (left, top, max(right, left), max(bottom, top))
+            for left, top, right, bottom in regions
+        ]
+        self.min_distance = max(min_distance, 1)
+        self.tries = tries  # Random candidates drawn for each point
+        self.rng = random.Random(seed)
+        self.cells = {}  # Cell of the spatial hash and the points inside it, cells are min_distance wide
+        self.points = []
+
+    def cell(self, point):
+        return (
+            math.floor(point[0] / self.min_distance),
+            math.floor(point[1] / self.min_distance),
+        )
+
+    # Distance to the closest point, only looking at the cells around the point. Returns min_distance if no point is closer
+    def clearance(self, point):
+        cell_x, cell_y = self.cell(point)
+        closest = self.min_distance
+        for x in range(cell_x - 1, cell_x + 2):
+            for y in range(cell_y - 1, cell_y + 2):
+                for other in self.cells.get((x, y), ()):
+                    closest = min(closest, math.dist(point, other))
+        return closest
+
+    # Random point inside one of the regions
+    def candidate(self):
+        weights = [
+            (right - left) * (bottom - top) or 1
+            for left, top, right, bottom in self.regions
+        ]
+        left, top, right, bottom = self.rng.choices(self.regions, weights)[0]
+        return (self.rng.uniform(left, right), self.rng.uniform(top, bottom))
+
+    # Add a point, the best of the tries if none of them has room
+    def add(self):
+        best, best_clearance = None, -1
+        for _ in range(self.tries):
+            point = self.candidate()
+            clearance = self.clearance(point)
+            if clearance > best_clearance:
+                best, best_clearance = point, clearance
+            if clearance >= self.min_distance:
+                break
+        self.points.append(best)
+        self.cells.setdefault(self.cell(best), []).append(best)
+        return best
+
+    # Add count points and return them
+    def spawn(self, count):
+        return [self.add() for _ in range(count)]
+
+
+# Sort items with the Ford-Johnson merge-insertion algorithm, which needs close to the fewest comparisons possible.
+# It is a generator that yields the pairs (a, b) it needs compared and receives True if a is ranked above b. Returns the items from the first to the last place
+def merge_insertion(items):
+    if len(items) <= 1:
+        return list(items)
+
+    # Compare the items in pairs and sort the losers of every pair recursively
+    losers = []
+    winner_of = {}  # Loser of each pair and the item that beat it
+    for index in range(0, len(items) - 1, 2):
+        first, second = items[index], items[index + 1]
+        if (yield (first, second)):
+            winner, loser = first, second
+        else:
+            winner, loser = second, first
+        losers.append(loser)
+        winner_of[loser] = winner
+    leftover = items[-1] if len(items) % 2 else None
+    chain = yield from merge_insertion(losers)
+
+    # The winner of the best loser is above everything in the chain, the other winners are inserted in the order of the Jacobsthal numbers, so every binary search uses as few comparisons as possible
+    pending = [winner_of[loser] for loser in chain]  # Winners by the place of their loser
+    bounds = list(chain)  # Each winner is above its loser, so it is only searched above it
+    if leftover is not None:
+        pending.append(leftover)
+        bounds.append(None)
+    chain.insert(0, pending[0])
+    inserted = 1
+    previous, current = 1, 1
+    while inserted < len(pending):
+        previous, current = current, current + 2 * previous
+        for index in reversed(range(inserted, min(current, len(pending)))):
+            item = pending[index]
+            low = 0
+            high = len(chain) if bounds[index] is None else chain.index(bounds[index])
+            while low < high:
+                middle = (low + high) // 2
+                if (yield (item, chain[middle])):
+                    high = middle
+                else:
+                    low = middle + 1
+            chain.insert(low, item)
+        inserted = min(current, len(pending))
+    return chain
+
+
+# Largest number of comparisons merge_insertion needs for count items
+def merge_insertion_comparisons(count):
+    return sum(math.ceil(math.log2(3 * k / 4)) for k in range(1, count + 1))
+
+
+# Runs merge_insertion one comparison at a time, for an interface that waits for the user to pick the better item of each pair
+class MergeInsertion:
+    def __init__(self, items):
+        self.steps = merge_insertion(list(items))
+        self.pair = None  # Items being compared, None once finished
+        self.order = None  # Items from the first to the last place, once finished
+        self.comparisons = 0  # Number of pairs answered
+        self.advance(None)
+
+    def advance(self, answer):
+        try:
+            self.pair = self.steps.send(answer)
+        except StopIteration as result:
+            self.pair = None
+            self.order = result.value
+
+    # Answer the current pair, True if its first item is ranked above the second
+    def answer(self, first_is_better):
+        self.comparisons += 1
+        self.advance(first_is_better)
+
+    def finished(self):
+        return self.order is not None
+
+
+# Order of the levels shown to one voter, and when to stop asking for more rankings.
+# The levels the previous voters agreed the least on, or ranked the fewest times, come first. After every ranking a Plackett-Luce model of this voter is updated, and the poll can stop once it is confident in the order of every pair of neighbouring variants.
+# The levels still to be shown are picked again after every ranking, putting first the ones where the previous voters best separated the pair the model is the least sure about
+class LevelScheduler:
+    def __init__(self, level_count, variant_count, confidence=0.95, min_levels=3, level_stats=None, seed=None, variant_names=None):
+        self.confidence_target = confidence
+        self.min_levels = min_levels  # Levels ranked before the poll can stop
+        self.level_stats = level_stats or {}  # Level index and (rankings, Kendall's W, points of each variant name) of the previous voters
+        self.variant_names = variant_names  # Names of the variant indices, to find their points in level_stats
+        self.model = PlackettLuce(variant_count)
+        rng = random.Random(seed)
+        self.tiebreak = [rng.random() for _ in range(level_count)]
+        self.order = sorted(
+            range(level_count), key=lambda level: (-self.uncertainty(level), self.tiebreak[level])
+        )  # Level indices in the order they are shown, before any ranking
+
+    # How little is known about a level: the disagreement between its rankings, shrinking with the number of rankings
+    def uncertainty(self, level):
+        rankings, agreement = self.level_stats.get(level, (0, None, {}))[:2]
+        return (1 - (agreement or 0)) / math.sqrt(rankings + 1)
+
+    # How far apart the previous voters put two variants in a level, from 0 (same points) to 1 (always first and last)
+    def separation(self, level, above, below):
+        rankings, _, points = self.level_stats.get(level, (0, None, {}))
+        if not rankings or self.variant_names is None or self.model.variant_count < 2:
+            return 0
+        difference = abs(
+            points.get(self.variant_names[above], 0) - points.get(self.variant_names[below], 0)
+        )
+        return difference / (rankings * (self.model.variant_count - 1))
+
+    # Order of the levels that were not shown yet, picked again from the rankings of this voter so far
+    def next_levels(self, shown):
+        shown = set(shown)
+        remaining = [level for level in self.order if level not in shown]
+        if not len(self.model) or self.model.variant_count < 2:
+            return remaining
+        above, below, _ = self.model.least_confident_pair()
+        return sorted(
+            remaining,
+            key=lambda level: (
+                -self.uncertainty(level) * (1 + self.separation(level, above, below)),
+                self.tiebreak[level],
+            ),
+        )
+
+    # Add the ranking of a level, with the variants from the first to the last place
+    def add(self, ranking):
+        self.model.add(ranking)
+
+    # Check if the order of the variants is settled
+    def converged(self):
+        return (
+            len(self.model) >= self.min_levels
+            and self.model.confidence() >= self.confidence_target
+        )
+
+
+# State of a whole poll without any interface: the folder, the slots of each level and the submitted rankings
+class PollEngine:
+    def __init__(self, folder):
+        self.folder = folder  # PollFolder with the variants and levels
+        self.variant_count = folder.variant_count
+        self.levels = [LevelState(self.variant_count) for _ in folder.levels]
+        self.rank_matrix = RankMatrix(self.variant_count, len(folder.levels))  # Place of each variant in every submitted level
+
+    # Save the ranking of a level once all of its slots are filled
+    def submit_level(self, level_index):
+        if not self.levels[level_index].complete():
+            raise ValueError(f"Level {level_index} has empty slots")
+        self.rank_matrix.append(self.levels[level_index].ranking())
+
+    # Points of each variant index
+    def scores(self):
+        points = borda_points(self.rank_matrix.places())
+        return {variant: int(points[variant]) for variant in range(self.variant_count)}
+
+    # Variant names and their points, from the highest to the lowest score
+    def final_scores(self):
+        scores = self.scores()
+        return {
+            self.folder.variant_names[variant]: points
+            for variant, points in sorted(scores.items(), key=lambda item: -item[1])
+        }
+
+    # Points, mean and median place, Kemeny place and bootstrap interval of the points of each variant, from the highest to the lowest score
+    def summary(self, samples=1000, confidence=0.95, seed=None):
+        return score_summary(
+            self.rank_matrix.places(), self.folder.variant_names, samples, confidence, seed
+        )
@@ -0,0 +1,277 @@
+from PIL import Image, ImageFile
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+from residency import image_cost
+from tracing import traced
+
+ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+
+# Information read from the header of an image file, without decoding its pixels
+class ImageHeader:
+    def __init__(self, filename, size, mode, image_format):
+        self.filename = filename
+        self.size = size  # (width, height) of the image
+        self.mode = mode  # PIL mode, like "RGB" or "L"
+        self.format = image_format  # PIL format, like "JPEG" or "PNG"
+
+
+# Open an image only to read its header. PIL doesn't decode the pixels until they are used
+@traced("read_header", lambda filepath, filename: {"file": filename})
+def read_header(filepath, filename):
+    with Image.open(os.path.normpath(os.path.join(filepath, filename))) as img:
+        return ImageHeader(filename, img.size, img.mode, img.format)
+
+
+# Checks if every file of a folder is a valid image by reading their headers on a thread pool
+class FolderValidator:
+    def __init__(self, filepath, filenames, workers=8):
+        self.filepath = filepath
+        self.filenames = filenames
+        self.workers = workers
+        self.headers = {}  # File name and its ImageHeader, for the valid images
+        self.failures = {}  # File name and the error found when reading it
+        self.checked_count = 0  # Number of files already checked
+        self.cancelled = False
+        self.lock = threading.Lock()
+        self.executor = None
+
+    # Start checking the files in the background
+    def start(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        for filename in self.filenames:
+            self.executor.submit(self.check_file, filename)
+        self.executor.shutdown(wait=False)
+
+    # Read the header of one file and save the result
+    def check_file(self, filename):
+        if self.cancelled:
+            return
+        try:
+            header = read_header(self.filepath, filename)
+            error = None
+        except Exception as e:
+            header = None
+            error = str(e) or type(e).__name__
+        with self.lock:
+            if header:
+                self.headers[filename] = header
+            else:
+                self.failures[filename] = error
+            self.checked_count += 1
+
+    # Check if all the files were read
+    def finished(self):
+        return self.checked_count == len(self.filenames)
+
+    # Stop checking the files that are still queued
+    def cancel(self):
+        self.cancelled = True
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Copies of an image where each one has half the size of the previous, so any resolution can be resized from the closest bigger copy instead of the full original
+# The biggest copy is only as big as the largest resolution requested so far (like the zoom resolution), the full original is only decoded if a bigger one is requested
+class ImagePyramid:
+    def __init__(self, path, decode_resolution=None, min_size=(64, 64)):
+        self.path = path  # Path of the original image, opened only when the pyramid is built
+        self.decode_resolution = decode_resolution  # Smallest resolution the biggest copy has to cover, None to always decode the full original
+        self.min_size = min_size  # The smallest copy is not smaller than this
+        self.levels = []  # Copies from the biggest to the smallest
+        self.full_size = None  # Size of the original, read when it is first opened
+        self.lock = threading.Lock()
+
+    # Check if the biggest copy can be resized to the resolution without losing sharpness. None asks for the full original
+    def covers(self, resolution):
+        if not self.levels:
+            return False
+        if self.levels[0].size == self.full_size:
+            return True
+        return (
+            resolution is not None
+            and self.levels[0].width >= resolution[0]
+            and self.levels[0].height >= resolution[1]
+        )
+
+    # Decode the original only at the size needed to cover the resolution.
+    # JPEG files are decoded at 1/2, 1/4 or 1/8 of the size with draft, the other formats are reduced right after decoding
+    @traced("decode", lambda self, resolution: {"file": self.path, "resolution": resolution, "source_size": self.full_size})
+    def decode(self, resolution):
+        with Image.open(self.path) as image:
+            self.full_size = image.size
+            if resolution is not None and image.format == "JPEG":
+                image.draft(None, (int(resolution[0]), int(resolution[1])))
+            image.load()
+        if resolution is not None:
+            factor = min(
+                image.width // max(int(resolution[0]), 1),
+                image.height // max(int(resolution[1]), 1),
+            )
+            if factor >= 2:
+                try:
+                    image = image.reduce(factor)
+                except ValueError:
+                    image = image.convert("RGBA").reduce(factor)
+        return image
+
+    # Decode the original and create the smaller copies. Only runs again after release, or if a resolution bigger than the biggest copy is requested
+    def build(self, resolution=None):
+        with self.lock:
+            if self.decode_resolution is None:
+                needed = None
+            elif resolution is None:
+                needed = self.decode_resolution
+            else:
+                needed = (
+                    max(resolution[0], self.decode_resolution[0]),
+                    max(resolution[1], self.decode_resolution[1]),
+                )
+            if self.covers(needed):
+                return self.levels
+            level = self.decode(needed)
+            levels = [level]
+            while (
+                level.width // 2 >= self.min_size[0]
+                and level.height // 2 >= self.min_size[1]
+            ):
+                try:
+                    level = level.reduce(2)
+                except ValueError:
+                    # Some modes (like palette images) can't be reduced directly
+                    level = level.convert("RGBA").reduce(2)
+                levels.append(level)
+            self.levels = levels
+            return levels
+
+    # Resize the smallest copy that is still as big as the requested resolution
+    def resize(self, resolution):
+        return self.resize_from(self.build(resolution), resolution)
+
+    # Resize from the copies that are already built, without decoding or waiting for a build. None if they don't cover the resolution
+    def resize_built(self, resolution):
+        levels = self.levels
+        if not levels or not (
+            levels[0].size == self.full_size
+            or (levels[0].width >= resolution[0] and levels[0].height >= resolution[1])
+        ):
+            return None
+        return self.resize_from(levels, resolution)
+
+    def resize_from(self, levels, resolution):
+        source = levels[0]
+        for level in levels[1:]:
+            if level.width < resolution[0] or level.height < resolution[1]:
+                break
+            source = level
+        return source.resize((int(resolution[0]), int(resolution[1])))
+
+    # Bytes used by the decoded copies
+    def memory_cost(self):
+        return sum(image_cost(level) for level in self.levels)
+
+    # Free the decoded copies, they are built again from the file when needed. Returns the number of bytes freed
+    def release(self):
+        with self.lock:
+            freed = self.memory_cost()
+            self.levels = []
+        return freed
+
+
+# Resize an image from its pyramid, using the thumbnail cache instead if the pyramid isn't built.
+# Only the slot resolution of prepare_level is stored in the cache, the other sizes (the window resized, the renditions outside of the view) would replace it on every resize
+def resize_cached(pyramid, resolution, cache=None, store=False):
+    image = None
+    if cache and not pyramid.levels:
+        image = cache.get(pyramid.path, resolution)
+    if image is None:
+        image = pyramid.resize(resolution)
+        if cache and store:
+            cache.put(pyramid.path, image)
+    return image
+
+
+# Pixels of one level that were decoded and resized outside of the Tk thread
+class PreparedLevel:
+    def __init__(self, page_images, pyramids, images_resized, resolution):
+        self.page_images = page_images  # File names of the level's images
+        self.pyramids = pyramids  # ImagePyramid of each image, built from the originals
+        self.images_resized = images_resized  # Images resized to the slot resolution
+        self.resolution = resolution  # Resolution the images were resized to
+
+        # Get the average color of one of the level's images to use as background
+        self.avg_color = self.images_resized[0].resize((1, 1)).getpixel((0, 0))
+
+    # Bytes used by the resized images and the decoded copies of the pyramids
+    def memory_cost(self):
+        return sum(image_cost(image) for image in self.images_resized) + sum(
+            pyramid.memory_cost() for pyramid in self.pyramids
+        )
+
+
+# Resize every image of a level. Only uses PIL, so it can run on any thread.
+# If the resized image is in the thumbnail cache, the original is not decoded, otherwise its image pyramid is built while resizing it.
+# The originals are only decoded at the size needed for the zoom resolution
+@traced("prepare_level", lambda filepath, page_images, resolution, cache=None, zoom_resolution=None: {"resolution": resolution, "images": len(page_images)})
+def prepare_level(filepath, page_images, resolution, cache=None, zoom_resolution=None):
+    pyramids = [
+        ImagePyramid(os.path.normpath(os.path.join(filepath, imagefile)), zoom_resolution)
+        for imagefile in page_images
+    ]
+    images_resized = [resize_cached(pyramid, resolution, cache, store=True) for pyramid in pyramids]
+    return PreparedLevel(page_images, pyramids, images_resized, resolution)
+
+
+# Prepares the levels right after the current one on a background worker, so the Tk thread only has to create the PhotoImages and canvas items
+class LevelPrefetcher:
+    def __init__(self, filepath, separated_images, window=2, workers=1, cache=None):
+        self.filepath = filepath
+        self.separated_images = separated_images
+        self.cache = cache  # ThumbnailCache with the resized images of previous sessions
+        self.window = window  # Number of levels after the current one that are prepared in advance
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.futures = {}  # Level index and the future with its PreparedLevel
+
+    # Queue the given level and the next ones inside the prefetch window, or inside a smaller window when memory is short.
+    # The levels prepared outside of a smaller window are dropped
+    def prefetch(self, level_index, resolution, zoom_resolution=None, window=None):
+        window = self.window if window is None else min(window, self.window)
+        last_index = min(level_index + window, len(self.separated_images) - 1)
+        for index in [index for index in self.futures if index > last_index]:
+            self.discard(index)
+        for index in range(level_index, last_index + 1):
+            if index not in self.futures:
+                self.futures[index] = self.executor.submit(
+                    prepare_level,
+                    self.filepath,
+                    self.separated_images[index],
+                    resolution,
+                    self.cache,
+                    zoom_resolution,
+                )
+
+    # Get the prepared pixels of a level, waiting for the worker if they are not ready yet
+    def get(self, level_index, resolution, zoom_resolution=None):
+        if level_index not in self.futures:
+            self.prefetch(level_index, resolution, zoom_resolution)
+        return self.futures.pop(level_index).result()
+
+    # Bytes used by the levels that are already prepared
+    def memory_cost(self):
+        return sum(
+            future.result().memory_cost()
+            for future in self.futures.values()
+            if future.done() and not future.cancelled() and future.exception() is None
+        )
+
+    # Drop a level that was queued or prepared but won't be shown as it was, like after the pages were ordered again
+    def discard(self, level_index):
+        future = self.futures.pop(level_index, None)
+        if future is not None:
+            future.cancel()
+
+    # Stop the worker and drop the levels that were not used
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.futures.clear()
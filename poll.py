@@ -1,18 +1,47 @@
 import tkinter as tk
 from PIL import Image, ImageTk, ImageFile
-from tkinter import ttk, filedialog
+from tkinter import filedialog, messagebox
+from concurrent.futures import ThreadPoolExecutor
 import pygame
+import argparse
 import os
+import sys
 import math
-import random
-import re
-import shutil
+import time
+import json
+from loader import FolderValidator, LevelPrefetcher, resize_cached
+from thumbnail_cache import ThumbnailCache
+from residency import ResidencyManager, image_cost, photo_cost
+from tiles import TileCache, TiledImage, render_tile
+from engine import (
+    MIN_SLOT_HEIGHT,
+    LevelScheduler,
+    MergeInsertion,
+    PollEngine,
+    PollFolder,
+    SlotGeometry,
+    SpawnLayout,
+    merge_insertion_comparisons,
+    slot_resolution,
+    write_poll_definition,
+)
+from renamer import RenameJob, SyncPlan
+from results_store import ResultsStore, RunningTotals, poll_id
+from tracing import LatencyStats, traced, tracer
 
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
 # Base program interface and functionalities
 class Application:
-    def __init__(self):
+    def __init__(
+        self,
+        prefetch_window=2,
+        memory_budget=2 * 1024 * 1024 * 1024,
+        spawn_seed=None,
+        results_store=None,
+        adaptive_confidence=None,
+        comparison_mode=False,
+    ):
         # Main window settings
         self.root = tk.Tk()
         self.root.geometry("1280x720")
@@ -21,6 +50,21 @@ class Application:
         if os.path.exists("./icon.ico"):
             self.root.iconbitmap(default="./icon.ico")
         self.filepath = ""
+        self.prefetch_window = prefetch_window  # Number of upcoming levels loaded in the background
+        self.tile_cache = TileCache(memory_budget // 8)  # Tiles of the zoomed images, an eighth of the memory budget
+        self.tile_executor = ThreadPoolExecutor(max_workers=2)  # Workers that decode and resize the tiles of the zoomed image
+        self.residency = ResidencyManager(memory_budget - self.tile_cache.budget_bytes)  # Releases images of other levels when over the rest of the memory budget
+        self.results_store = results_store  # ResultsStore that keeps the ranking of every submitted level, None to not save them
+        self.adaptive_confidence = adaptive_confidence  # Confidence in the order of the variants that ends the poll early, None to show every level
+        self.comparison_mode = comparison_mode  # If the images of every level are first compared in pairs, instead of dragged into the slots
+        self.spawn_seed = spawn_seed  # Seed of the spawn layouts, None for a different layout every time
+        self.min_slot_height = MIN_SLOT_HEIGHT  # With many variants the slots keep this height and the level can be scrolled
+        self.autoscroll_margin = 30  # Distance from the top or bottom of the window where a dragged image scrolls the level
+        self.frame_interval = 1 / 60  # Minimum time between canvas updates when dragging an image, in seconds
+        self.drag_latency = LatencyStats("drag_latency")  # Time from a motion event to the image being moved
+        self.thumbnail_cache = ThumbnailCache()  # Resized images saved between sessions
+        self.resize_executor = ThreadPoolExecutor(max_workers=1)  # Worker for the high quality resizes after the window changes size
+        self.pyramid_executor = ThreadPoolExecutor(max_workers=2)  # Workers that decode the originals of the images that are enlarged, only once they are needed
         self.background_color = "#282D2F"
         self.root.config(bg=self.background_color)
         self.button_style = {
@@ -74,6 +118,13 @@ class Application:
             font=("Helvetica", 16),
             **self.button_style,
         )
+        self.definition_button = tk.Button(
+            self.folder_container,
+            text="Select Poll File",
+            command=self.open_definition,
+            font=("Helvetica", 16),
+            **self.button_style,
+        )
         self.start_button = tk.Button(
             self.start_container,
             text="Start",
@@ -142,6 +193,17 @@ class Application:
             font=("Helvetica", 32, "bold"),
         )
 
+        # Button to stop checking the images of the folder
+        self.cancel_button = tk.Button(
+            self.root,
+            text="Cancel",
+            command=self.cancel_validation,
+            font=("Helvetica", 16),
+            **self.button_style,
+        )
+        self.cancel_button.bind("<ButtonPress-1>", self.play_button_press)
+        self.cancel_button.bind("<ButtonRelease-1>", self.play_button_release)
+
         # Load widgets
         self.load_start()
 
@@ -151,6 +213,7 @@ class Application:
         self.start_container.place(relx=0.5, rely=0.4, anchor="n", width=1024)
         self.folder_container.pack(anchor="center", pady=(0, 5), fill="x", expand=True)
         self.folder_button.grid(row=0, column=1)
+        self.definition_button.grid(row=0, column=2, sticky="w", padx=5)
         self.path_label.grid(row=0, column=0, sticky="e")
         self.folder_container.grid_columnconfigure(0, weight=1, minsize=437)
         self.folder_container.grid_columnconfigure(1, weight=1, minsize=150)
@@ -165,37 +228,31 @@ class Application:
         self.rename_screen_button.bind("<ButtonPress-1>", self.play_button_press)
         self.rename_screen_button.bind("<ButtonRelease-1>", self.play_button_release)
 
-    # Count variants and check if they are consistent for every level
-    def count_variants(self):
-        variants_dict = {}
-
-        for filename in os.listdir(self.filepath):
-            basename = re.sub(r"\d*\.\w+$", r"", filename)
-            # Add 1 to the count of levels of the variant
-            variants_dict[basename] = variants_dict.get(basename, 0) + 1
-        variant_values = list(variants_dict.values())
-
-        if len(set(variant_values)) != 1:
-            return False
-        else:
-            return len(variants_dict.keys())
-
     # Calculate aspect ratio of the images based on the first one, the rest will be stretched to the same aspect ratio if different
     def calculate_aspect(self):
-        with Image.open(
-            os.path.normpath(os.path.join(self.filepath, self.imagelist[0]))
-        ) as img:
-            self.base_resolution = img.size
-            gcd = math.gcd(self.base_resolution[0], self.base_resolution[1])
-            self.aspectratio = (
-                self.base_resolution[0] / gcd,
-                self.base_resolution[1] / gcd,
-            )
+        self.base_resolution = self.image_headers[self.imagelist[0]].size
+        gcd = math.gcd(self.base_resolution[0], self.base_resolution[1])
+        self.aspectratio = (
+            self.base_resolution[0] / gcd,
+            self.base_resolution[1] / gcd,
+        )
 
     # Get the selected folder, removes previous warnings and enable Start Button
     def open_folder(self):
-        self.filepath = filedialog.askdirectory()
-        self.path_label.config(text=f"Folder: {self.filepath}")
+        self.select_poll(filedialog.askdirectory(), "Folder")
+
+    # Get a poll definition saved by the File Renamer, which uses the images where they are
+    def open_definition(self):
+        self.select_poll(
+            filedialog.askopenfilename(
+                filetypes=[("Poll files", "*.poll.json"), ("All files", "*.*")]
+            ),
+            "Poll file",
+        )
+
+    def select_poll(self, path, kind):
+        self.filepath = path
+        self.path_label.config(text=f"{kind}: {self.filepath}")
         if self.filepath:
             # Remove warnings
             self.folder_warning.pack_forget()
@@ -205,76 +262,137 @@ class Application:
             # Enable Start Button
             self.start_button.config(state=tk.NORMAL)
 
-    # Load and start the polls
+    # Check the folder and start validating its images in the background
     def start_poll(self):
         self.play_button_release()
+        self.file_warning.pack_forget()
+        # Index the variants and levels of the folder, or read the index saved the last time it was opened
         try:
-            self.imagelist = os.listdir(self.filepath)
+            self.poll_folder = PollFolder(self.filepath)
         except Exception as e:
             # Show warning if there is an error
             self.folder_warning.config(text=f"Error {e}")
             self.folder_warning.pack()
             return
-
-        # Check if all the files are valid images
-        for file in self.imagelist:
-            try:
-                with Image.open(
-                    os.path.normpath(os.path.join(self.filepath, file))
-                ) as img:
-                    pass
-            except:
-                self.file_warning.pack()
-                return
-
-        self.titledict = {}  # Dictionary with the number identifier of the variant and its name
-        self.pages = []  # List with objects for each level's page
-        self.results = [] # List of lists with the resulting order of image variants for each page
-
-
-        self.calculate_aspect()
-        self.total_variants_count = self.count_variants()
-
-        # Show warning if inconsistent number of variants for the pages
-        if not self.total_variants_count:
+        self.imagelist = self.poll_folder.filenames
+        self.total_variants_count = self.poll_folder.variant_count
+
+        # Show warning if a variant is missing levels or the files aren't renamed
+        if not self.poll_folder.valid():
+            self.image_warning.config(
+                text="\n".join(self.poll_folder.problems())
+                + '\nThe images are not set up properly.\nUse the "Rename Images" button at the bottom!'
+            )
             self.image_warning.pack()
             return
-        
+
         # Clear current screen
         self.title.pack_forget()
         self.start_container.place_forget()
         self.rename_screen_button.pack_forget()
         self.rename_label.pack_forget()
         self.loading_label.place(relx=0.5, rely=0.5, anchor="center")
+        self.cancel_button.place(relx=0.5, rely=0.6, anchor="center")
+
+        # Check if all the files are valid images by reading their headers
+        self.validator = FolderValidator(self.filepath, self.imagelist)
+        self.validation_start = tracer.now()
+        self.validator.start()
+        self.check_validation()
+
+    # Show the validation progress and start the poll when every file was checked
+    def check_validation(self):
+        if self.validator.cancelled:
+            return
+        self.loading_label.config(
+            text=f"Checking images... {self.validator.checked_count}/{len(self.imagelist)}"
+        )
+        if not self.validator.finished():
+            self.root.after(50, self.check_validation)
+            return
+
+        self.cancel_button.place_forget()
+        self.loading_label.config(text="Loading...")
+        if tracer.enabled:
+            tracer.record(
+                "validation",
+                self.validation_start,
+                {"files": len(self.imagelist), "failures": len(self.validator.failures)},
+            )
+
+        # Go back to the starting screen and list the files that are not valid images
+        if self.validator.failures:
+            self.loading_label.place_forget()
+            self.load_start()
+            failures = sorted(self.validator.failures.items())
+            failure_lines = [f"{file}: {error}" for file, error in failures[:5]]
+            if len(failures) > 5:
+                failure_lines.append(f"...and {len(failures) - 5} more")
+            self.file_warning.config(
+                text=f"{len(failures)} file(s) in the folder are not valid images.\n"
+                + "\n".join(failure_lines)
+            )
+            self.file_warning.pack()
+            return
+
+        self.image_headers = self.validator.headers  # Size, mode and format of every image
+        self.load_poll()
+
+    # Stop checking the images and go back to the starting screen
+    def cancel_validation(self):
+        self.validator.cancel()
+        self.cancel_button.place_forget()
+        self.loading_label.place_forget()
+        self.loading_label.config(text="Loading...")
+        self.load_start()
 
-        self.templist = []  # List used to create self.separated_images list
-        self.separated_images = []  # List of lists of images for each page
-        self.level_index = 0  # Counter for the level when creating self.separated_images list
+    # Load and start the polls
+    def load_poll(self):
+        self.poll = PollEngine(self.poll_folder)  # Slots and results of every level, without the interface
+        self.titledict = dict(enumerate(self.poll_folder.variant_names))  # Dictionary with the number identifier of the variant and its name
         self.current_page = 0  # Number of the current page
-        self.variant_index = 0 # Counter for the variants in the loop
-        self.imagecount = len(self.imagelist)
-        self.levelsize = int(self.imagecount/self.total_variants_count)
-
-        # Add the images to the separated_list
-        for counter in range(self.imagecount):
-            if counter < self.total_variants_count:
-                self.titledict[self.variant_index] = re.sub(r"\d*\.\w+$", r"", self.imagelist[self.levelsize*self.variant_index])
-
-            self.templist.append(self.imagelist[self.level_index + self.levelsize*self.variant_index])
-            self.variant_index += 1
-            # Add to self.separated_images if at the last image of the variation
-            if (self.variant_index) % (self.total_variants_count) == 0:
-                self.separated_images.append(self.templist)
-                self.templist = []
-                self.level_index += 1
-                self.variant_index = 0
-
-        # Create dictionary with the number id of the variants and their current score
-        self.pointdict = {i: 0 for i in range(self.total_variants_count)}
-        # Load the page levels
-        for count, page in enumerate(self.separated_images):
-            self.pages.append(Level(self, page))
-            self.pages[count].canvas.pack_forget()
+        self.poll_id = poll_id(self.poll_folder.variant_names, len(self.poll_folder.levels))  # Identifier of the poll in the results store
+        self.level_started = {}  # Page index and when it was first shown
+        if self.results_store is not None:
+            self.results_store.open_poll(self.filepath)
+
+        # Show the levels the previous voters were the least sure about first, and stop once the ranking is settled
+        self.scheduler = None
+        self.level_order = list(range(len(self.poll_folder.levels)))  # Level index of each page
+        if self.adaptive_confidence is not None:
+            level_stats = {}
+            if self.results_store is not None:
+                totals = RunningTotals(self.results_store.path)
+                try:
+                    totals.update()
+                except OSError as e:
+                    # The records read before the snapshot failed to save are still counted
+                    self.results_store_failed(e)
+                level_stats = totals.level_stats(self.poll_id)
+            self.scheduler = LevelScheduler(
+                len(self.poll_folder.levels),
+                self.poll_folder.variant_count,
+                self.adaptive_confidence,
+                level_stats=level_stats,
+                seed=self.spawn_seed,
+                variant_names=self.poll_folder.variant_names,
+            )
+            self.level_order = list(self.scheduler.order)
+        self.separated_images = [
+            self.poll_folder.levels[level] for level in self.level_order
+        ]  # List of lists of images for each page
+
+        self.calculate_aspect()
+        self.root.update_idletasks()
+
+        # The levels are only created when shown, the next ones are loaded in the background
+        self.pages = [None] * len(self.separated_images)
+        self.prefetcher = LevelPrefetcher(
+            self.filepath,
+            self.separated_images,
+            self.prefetch_window,
+            cache=self.thumbnail_cache,
+        )
 
         self.last_page_index = len(self.pages) - 1
 
@@ -289,8 +407,8 @@ class Application:
             activebackground="#D0D0D0",
         )
         self.next_button.pack(side="right", fill="y")
-        self.loading_label.place_forget()
         self.show_page(0)  # Show the first level
+        self.loading_label.place_forget()
 
         self.next_button.bind(
             "<ButtonPress-1>", self.play_button_press
@@ -314,16 +432,81 @@ class Application:
         if self.audio_image_release_exists:
             self.audio_image_release.play()
 
+    # Calculate the biggest image resolution that fits in the slots of a canvas with the given size
+    def fit_resolution(self, width, height):
+        return slot_resolution(
+            width, height, self.total_variants_count, self.base_resolution, self.min_slot_height
+        )
+
+    # Calculate the biggest resolution of a zoomed image that fits in a canvas with the given size
+    def fit_full_resolution(self, width, height):
+        bottleneck = min(
+            height * self.aspectratio[0],
+            width * self.aspectratio[1],
+        )
+        return (
+            max(math.floor(bottleneck / self.aspectratio[1]), 1),
+            max(math.floor(bottleneck / self.aspectratio[0]), 1),
+        )
+
+    # Zoom resolution used to load the next levels, the originals are only decoded at the size needed for it
+    def zoom_resolution(self):
+        if self.pages[self.current_page] is not None:
+            return self.pages[self.current_page].full_image_resolution
+        return self.fit_full_resolution(
+            self.root.winfo_width() - self.next_button.winfo_reqwidth(),
+            self.root.winfo_height(),
+        )
+
+    # Resolution used to load the next levels, taken from the level being shown
+    def prefetch_resolution(self):
+        if self.pages[self.current_page] is not None:
+            return self.pages[self.current_page].image_resolution
+        return self.fit_resolution(
+            self.root.winfo_width() - self.next_button.winfo_reqwidth(),
+            self.root.winfo_height(),
+        )
+
     # Hide current page and show the next one
+    @traced("show_page", lambda self, page_number: {"page": page_number})
     def show_page(self, page_number):
-        self.pages[self.current_page].canvas.pack_forget()  # Hide current page
+        resolution = self.prefetch_resolution()
+        zoom_resolution = self.zoom_resolution()
+        if self.pages[self.current_page] is not None:
+            if self.pages[self.current_page].zoom_view is not None:
+                self.pages[self.current_page].zoom_view.close()
+            self.pages[self.current_page].canvas.pack_forget()  # Hide current page
         self.current_page = page_number  # Update page index
+        self.level_started.setdefault(page_number, time.time())
+        # Create the level from the images loaded in the background
+        if self.pages[self.current_page] is None:
+            self.pages[self.current_page] = Level(
+                self,
+                self.separated_images[self.current_page],
+                self.prefetcher.get(self.current_page, resolution, zoom_resolution),
+                self.poll.levels[self.level_order[self.current_page]],
+            )
+        # Reload the images if they were released, on the prefetch worker like a new level
+        elif self.pages[self.current_page].images_released:
+            self.pages[self.current_page].restore_images(
+                self.prefetcher.get(self.current_page, resolution, zoom_resolution)
+            )
         self.pages[self.current_page].canvas.pack(anchor="nw", side=tk.LEFT, fill="both", expand=True)  # Load next page
         # Update next page data
         self.pages[self.current_page].canvas.update()
         self.pages[self.current_page].adjust_sizes()
         self.update_button()
         self.root.config(bg=self.pages[self.current_page].color)
+        # Release images of the other levels if over the memory budget, counting the levels prepared in advance
+        self.residency.touch(self.current_page, self.pages[self.current_page])
+        total = self.residency.enforce({self.current_page}, self.prefetcher.memory_cost())
+        # Start loading the next levels while the user votes on this one, only the next one while the budget is still exceeded
+        self.prefetcher.prefetch(
+            self.current_page + 1,
+            self.prefetch_resolution(),
+            self.zoom_resolution(),
+            window=0 if total > self.residency.budget_bytes else None,
+        )
 
     # Update the 'Next' button
     def update_button(self):
@@ -332,16 +515,64 @@ class Application:
         if self.current_page == self.last_page_index:
             self.next_button.config(command=lambda: self.finish_game())  # Load final screen if in the last page
 
+    # Save the results of the level of a page and write them to the results store
+    def submit_level(self, page_number):
+        level_index = self.level_order[page_number]
+        self.poll.submit_level(level_index)
+        if self.scheduler is not None:
+            self.scheduler.add(self.poll.levels[level_index].ranking())
+        if self.results_store is not None:
+            try:
+                self.results_store.append(
+                    self.poll_id,
+                    level_index,
+                    [
+                        self.titledict[variant]
+                        for variant in self.poll.levels[level_index].ranking()
+                    ],
+                    self.level_started[page_number],
+                    time.time(),
+                )
+            except OSError as e:
+                self.results_store_failed(e)
+
+    # Stop saving the results once the results file can't be written (like a read-only folder), so the poll can go on.
+    # The levels are already counted in memory, so they still show on the ranking screen
+    def results_store_failed(self, error):
+        messagebox.showwarning(
+            "Results not saved",
+            f"Can't write the results to {self.results_store.path}:\n{error}\n\nThe poll goes on without saving them, choose another file with --results.",
+        )
+        try:
+            self.results_store.close()
+        except OSError:
+            pass
+        self.results_store = None
+
     # Save current page results and run show_page
     def show_next_page(self):
         self.play_button_release()
-        self.results.append(self.pages[self.current_page].slotted_image_list)  # Save current page results
-        if self.current_page < self.last_page_index:
+        self.submit_level(self.current_page)  # Save current page results
+        # Finish early if the adaptive scheduler is already sure about the ranking
+        if self.scheduler is not None and self.scheduler.converged():
+            self.end_poll()
+        elif self.current_page < self.last_page_index:
+            if self.scheduler is not None:
+                self.reorder_pages()
             self.show_page(self.current_page + 1)
 
+    # Pick the levels of the next pages again from the rankings submitted so far. The levels prepared for pages that changed are dropped
+    def reorder_pages(self):
+        remaining = self.scheduler.next_levels(self.level_order[: self.current_page + 1])
+        for page, level in enumerate(remaining, self.current_page + 1):
+            if self.level_order[page] != level:
+                self.level_order[page] = level
+                self.separated_images[page] = self.poll_folder.levels[level]
+                self.prefetcher.discard(page)
+
     # Enable button if all slots are filled
     def button_check(self):
-        if not 0 in self.pages[self.current_page].slotted_image_list:
+        if self.pages[self.current_page].level_state.complete():
             self.next_button.config(state=tk.NORMAL)
         else:
             self.next_button.config(state=tk.DISABLED)
@@ -351,7 +582,16 @@ class Application:
         self.play_button_release()
 
         # Save last page results
-        self.results.append(self.pages[self.current_page].slotted_image_list)
+        self.submit_level(self.current_page)
+        self.end_poll()
+
+    # Show the ranking and the button that closes the program
+    def end_poll(self):
+        if self.pages[self.current_page].zoom_view is not None:
+            self.pages[self.current_page].zoom_view.close()
+        if self.results_store is not None:
+            self.results_store.close()
+        self.prefetcher.shutdown()
         # Switch next button for a finish button
         self.next_button.pack_forget()
         self.end_button = tk.Button(
@@ -374,142 +614,38 @@ class Application:
         self.calculate_score()
         self.ranking_screen()
 
-    # Calculate the score of each variant
+    # Calculate the score of each variant, with the other rank aggregations and the uncertainty of the score
     def calculate_score(self):
-        for pageresult in self.results:
-            for subtractor, identifier in enumerate(pageresult):
-                self.pointdict[identifier - 2 - math.ceil(self.total_variants_count / 2)] += (self.total_variants_count - 1 - subtractor)
-        self.finaldict = {
-            self.titledict[key[0]]: self.pointdict[key[0]]
-            for key in sorted(self.pointdict.items(), key=lambda item: -item[1])
-        }
-
-    # Adjust size of the scroll region of the ranking list when resizing window
-    def ranking_configure(self, event):
-        self.rankingcanvas.itemconfig(1, width=self.rankingcanvas.winfo_width())
-        if self.canvasgrid.bbox("all")[3] > self.rankingcanvas.winfo_height():
-            self.rankingcanvas.configure(
-                scrollregion=(
-                    0,
-                    0,
-                    self.canvasgrid.bbox("all")[2],
-                    self.canvasgrid.bbox("all")[3],
-                )
-            )
-        else:
-            self.rankingcanvas.configure(
-                scrollregion=(
-                    0,
-                    0,
-                    self.canvasgrid.bbox("all")[2],
-                    self.rankingcanvas.winfo_height(),
-                )
-            )
+        self.finaldict = self.poll.final_scores()
+        self.score_summary = self.poll.summary()
 
     # Load the screen with the ranking
+    @traced("ranking_screen", lambda self: {"variants": len(self.finaldict)})
     def ranking_screen(self):
         # Change background color and clear current screen
         self.root.config(bg="#282D2F")
         self.pages[self.current_page].canvas.pack_forget()
 
-        self.contestantnamelist = []
-        self.contestantpointlist = []
-        self.separator = []
-        self.horizontalseparatorlist = []
-
-        # Creating the widgets
-        self.rankingframe = tk.Frame(self.root)
-        self.rankingcanvas = tk.Canvas(self.rankingframe, bg="#383D3F", highlightthickness=0)
-        self.scrollbar = tk.Scrollbar(
-            self.rankingframe,
-            orient="vertical",
-            command=self.rankingcanvas.yview(),
-            bg="#50565B",
-            troughcolor="#383D3F",
-        )
-        self.canvasgrid = tk.Frame(self.rankingcanvas, bg="#50565B")
-
-        # Load the widgets
+        self.rankingframe = tk.Frame(self.root, bg="#282D2F")
         self.rankingframe.pack(
             anchor=tk.CENTER, fill=tk.BOTH, expand=True, padx=250, pady=50
         )
-        self.rankingcanvas.pack(side=tk.LEFT, expand=True, fill="both", padx=0)
-        self.scrollbar.pack(side=tk.RIGHT, fill="y")
-        self.rankingcanvas.config(yscrollcommand=self.scrollbar.set)
-        self.rankingcanvas.update()
-        self.rankingcanvas.create_window(
-            4,
-            4,
-            window=self.canvasgrid,
-            anchor="nw",
-            width=self.rankingcanvas.winfo_width() - 8,
-        )
-        # Load variant names and scores
-        contestant_index = 0
-        for contestant, point in self.finaldict.items():
-            self.canvasgrid.columnconfigure(0, weight=1)
-            self.separator.append(ttk.Separator(self.canvasgrid, orient="horizontal"))
-            self.horizontalseparatorlist.append(tk.Frame(self.canvasgrid, bg="#50565B"))
-            self.contestantnamelist.append(
-                tk.Label(
-                    self.horizontalseparatorlist[contestant_index],
-                    text=contestant,
-                    font=("Helvetica", 24),
-                    background="#50565B",
-                    foreground="#E0E0E0",
-                )
-            )
-            self.contestantpointlist.append(
-                tk.Label(
-                    self.horizontalseparatorlist[contestant_index],
-                    text=(f"Score: {point}"),
-                    font=("Helvetica", 24),
-                    background="#50565B",
-                    foreground="#E0E0E0",
+        self.ranking_list = RankingList(
+            self.rankingframe,
+            [
+                (
+                    place + 1,
+                    row["name"],
+                    row["points"],
+                    f"95% interval {row['interval'][0]:.0f}-{row['interval'][1]:.0f}   "
+                    f"Mean rank {row['mean_rank']:.2f}   Median rank {row['median_rank']:g}   "
+                    f"Kemeny place {row['kemeny_place']}",
                 )
-            )
-            self.horizontalseparatorlist[contestant_index].grid(
-                row=contestant_index * 2, sticky="we"
-            )
-            self.contestantnamelist[contestant_index].pack(padx=10, side=tk.LEFT)
-            self.contestantpointlist[contestant_index].pack(side=tk.RIGHT, padx=10)
-            self.separator[contestant_index].grid(
-                row=(contestant_index * 2 + 1), column=0, sticky="we"
-            )
-            self.canvasgrid.rowconfigure(contestant_index * 2, weight=1, minsize=75)
-            contestant_index += 1
-
-        self.rankingcanvas.bind_all(
-            "<MouseWheel>",
-            lambda e: self.rankingcanvas.yview_scroll(
-                int(-1 * (e.delta / 60)), "units"
-            ),
+                for place, row in enumerate(self.score_summary)
+            ],
+            self.button_style,
         )
 
-        self.separator[-1].destroy()
-
-        # Adjust scroll region size
-        if self.canvasgrid.bbox("all")[3] > self.rankingcanvas.winfo_height():
-            self.rankingcanvas.configure(
-                scrollregion=(
-                    0,
-                    0,
-                    self.canvasgrid.bbox("all")[2],
-                    self.canvasgrid.bbox("all")[3],
-                )
-            )
-        else:
-            self.rankingcanvas.configure(
-                scrollregion=(
-                    0,
-                    0,
-                    self.canvasgrid.bbox("all")[2],
-                    self.rankingcanvas.winfo_height(),
-                )
-            )
-
-        self.rankingcanvas.bind("<Configure>", self.ranking_configure)
-
     # Close the app when finished
     def close_app(self):
         self.root.destroy()
@@ -582,7 +718,7 @@ class Application:
             background=self.background_color,
             fg="white",
             font=("Helvetica", 11),
-            text="1) Use this to create a folder with the renamed images based on their variants, so they can be used in the poll. A variant can be any type of variation, like a different camera, different weather, perspective, etc.\n\n2) The files will be renamed with the variant as the title and the stage identified by the number at the end (e.g., 'FirstVariant1' and 'SecondVariant1' for the first level,'FirstVariant2' and 'SecondVariant2' for the second level).\n\n3) If you use the 'Files' button, you can select multiple images at once, but they their stages will be defined by their names in alphabetical order. If the files are not sorted alphabetically, use the 'Add 1' button to add the files one-by-one in order.\n\n4) All levels need the same number of variants. A new folder called 'renamed_files' in the current directory will be created.",
+            text="1) Use this to create a folder with the renamed images based on their variants, so they can be used in the poll. A variant can be any type of variation, like a different camera, different weather, perspective, etc.\n\n2) The files will be renamed with the variant as the title and the stage identified by the number at the end (e.g., 'FirstVariant1' and 'SecondVariant1' for the first level,'FirstVariant2' and 'SecondVariant2' for the second level).\n\n3) If you use the 'Files' button, you can select multiple images at once, but they their stages will be defined by their names in alphabetical order. If the files are not sorted alphabetically, use the 'Add 1' button to add the files one-by-one in order.\n\n4) All levels need the same number of variants. A folder called 'renamed_files' in the current directory will be created, or updated if it already exists.",
         )
         self.variant_path_labels.append(
             tk.Label(
@@ -653,6 +789,27 @@ class Application:
             state=tk.DISABLED,
             command=self.setup_renaming,
         )
+        self.rename_options_container = tk.Frame(self.rename_container, bg=self.background_color)
+        self.save_definition_button = tk.Button(
+            self.rename_options_container,
+            text="Save Poll File",
+            font=("Helvetica", 12),
+            **self.button_style,
+            state=tk.DISABLED,
+            command=self.save_definition,
+        )
+        self.compare_contents = tk.BooleanVar(value=False)  # Compare the contents of files with the same size but another modification time when syncing
+        self.compare_contents_button = tk.Checkbutton(
+            self.rename_options_container,
+            text="Compare file contents",
+            variable=self.compare_contents,
+            bg=self.background_color,
+            fg="white",
+            selectcolor="#515A60",
+            activebackground=self.background_color,
+            activeforeground="white",
+            font=("Helvetica", 10),
+        )
         self.back_button = tk.Button(
             self.root,
             **self.button_style,
@@ -703,7 +860,10 @@ class Application:
         self.rename_title.pack(pady=(100, 0))
         self.rename_disclaimer.pack(pady=5)
         self.rename_container.pack(pady=(50, 5))
-        self.rename_button.grid(row=3, column=1, pady=(40))
+        self.rename_button.grid(row=3, column=1, pady=(40, 0))
+        self.rename_options_container.grid(row=4, column=1, pady=(5, 40))
+        self.compare_contents_button.pack()
+        self.save_definition_button.pack(pady=(5, 0))
         self.back_button.pack(side=tk.BOTTOM, pady=(5, 10))
         self.rename_container.grid_columnconfigure(0, weight=1, minsize=437)
         self.rename_container.grid_columnconfigure(1, weight=1, minsize=150)
@@ -794,20 +954,25 @@ class Application:
         # Check if variants have same amount of images
         for path in self.rename_filepath[1:]:
             if not path:
-                self.rename_button.config(state=tk.DISABLED)
+                self.set_rename_state(tk.DISABLED)
                 return
             if len(path) != last_len:
                 self.variant_number_incompatible_warning.pack()
-                self.rename_button.config(state=tk.DISABLED)
+                self.set_rename_state(tk.DISABLED)
                 return
             last_len = len(path)
-        self.rename_button.config(state=tk.NORMAL)
+        self.set_rename_state(tk.NORMAL)
+
+    # Enable or disable the buttons that need every variant to have the same number of files
+    def set_rename_state(self, state):
+        self.rename_button.config(state=state)
+        self.save_definition_button.config(state=state)
 
     # Increase the number of variants by 1
     def increase_variant(self):
         self.variant_count += 1
         self.rename_filepath.append([])
-        self.rename_button.config(state=tk.DISABLED)
+        self.set_rename_state(tk.DISABLED)
 
         # Create widgets
         self.variant_entries.append(
@@ -910,6 +1075,20 @@ class Application:
 
     # Check if folder, variant count and names are OK and run the rename function
     def setup_renaming(self):
+        if not self.check_variant_names():
+            return
+
+        # Run function to create the renamed files on a new folder
+        try:
+            self.rename()
+
+        # Show a warning if there is an error
+        except Exception as e:
+            self.error_rename_warning.config(text=f"Error {e}")
+            self.error_rename_warning.pack()
+
+    # Read the variant names and show a warning if they can't be used
+    def check_variant_names(self):
         # Clear main screen
         self.error_rename_warning.pack_forget()
         self.successful_rename_warning.pack_forget()
@@ -925,44 +1104,97 @@ class Application:
             self.variant_names[i] = entry.get()
             if self.variant_names[i] == "":
                 self.empty_entry_warning.pack()
-                return
+                return False
             elif not self.variant_names[i].isalpha():
                 self.no_special_warning.pack()
-                return
+                return False
         if len(self.variant_names) != len(set(self.variant_names)):
             self.repeated_variant_warning.pack()
-            return
+            return False
+        return True
 
-        # Run function to create the renamed files on a new folder
+    # Save a poll file that points to the selected images instead of renaming them, so they don't need to be copied or linked
+    def save_definition(self):
+        if not self.check_variant_names():
+            return
+        path = filedialog.asksaveasfilename(
+            defaultextension=".poll.json",
+            initialfile="poll.poll.json",
+            filetypes=[("Poll files", "*.poll.json")],
+        )
+        if not path:
+            return
         try:
-            self.rename()
-            self.successful_rename_warning.pack()
-
-        # Show a warning if there is an error
+            write_poll_definition(path, self.variant_names, self.rename_filepath)
         except Exception as e:
             self.error_rename_warning.config(text=f"Error {e}")
             self.error_rename_warning.pack()
+            return
+        self.successful_rename_warning.config(
+            text="Poll file saved, select it with \"Select Poll File\" to start the poll."
+        )
+        self.successful_rename_warning.pack()
 
-    # Add renamed files to output folder
+    # Sync the output folder with the renamed files: only new or changed files are placed and the files that aren't renamed anymore are removed.
+    # They are linked instead of copied when possible, in the background
     def rename(self):
         output_path = os.path.normpath(
             os.path.join(os.path.abspath(os.curdir), "renamed_files")
         )
-        if os.path.exists(output_path) and os.path.isdir(output_path):
-            shutil.rmtree(output_path)
-        os.mkdir(output_path)
+        os.makedirs(output_path, exist_ok=True)
+        plan = []
         for variant_number, variant_files in enumerate(self.rename_filepath):
             for stage, file in enumerate(variant_files):
                 new_filename = (
                     f"{self.variant_names[variant_number]}{stage+1}"
                     + os.path.splitext(file)[1]
                 )  # Generate the new name of the file: Variant + Stage_counter
-                shutil.copy(
-                    file,
-                    os.path.normpath(
-                        os.path.join(output_path, os.path.basename(new_filename))
-                    ),
-                )  # Copy image to output folder with new name
+                plan.append(
+                    (
+                        file,
+                        os.path.normpath(
+                            os.path.join(output_path, os.path.basename(new_filename))
+                        ),
+                    )
+                )
+        # The folder is compared on the rename worker, reading every file can take a while with Compare file contents
+        self.sync_plan = SyncPlan(plan, output_path, self.compare_contents.get())
+        self.rename_job = RenameJob(self.sync_plan)
+        self.rename_job.start()
+        self.rename_button.config(state=tk.DISABLED)
+        self.check_rename()
+
+    # Show the progress of the renaming and the result once every file was placed
+    def check_rename(self):
+        if self.rename_job.planned:
+            text = f"Renaming files... {self.rename_job.done_count}/{len(self.rename_job.plan)}"
+        else:
+            text = f"Comparing files... {self.sync_plan.compared_count}/{len(self.sync_plan.plan)}"
+        self.successful_rename_warning.config(text=text)
+        self.successful_rename_warning.pack()
+        if not self.rename_job.finished():
+            self.root.after(50, self.check_rename)
+            return
+
+        self.rename_button.config(state=tk.NORMAL)
+        try:
+            self.rename_job.commit()
+        except Exception as e:
+            self.successful_rename_warning.pack_forget()
+            self.error_rename_warning.config(text=f"Error {e}")
+            self.error_rename_warning.pack()
+            return
+        if self.rename_job.failures:
+            self.successful_rename_warning.pack_forget()
+            source, error = next(iter(self.rename_job.failures.items()))
+            self.error_rename_warning.config(
+                text=f"{len(self.rename_job.failures)} file(s) couldn't be renamed.\n{os.path.basename(source)}: {error}"
+            )
+            self.error_rename_warning.pack()
+            return
+        self.successful_rename_warning.config(
+            text=f"Files renamed successfully ({', '.join(filter(None, [self.rename_job.summary(), f'{self.sync_plan.unchanged_count} unchanged', f'{len(self.sync_plan.stale)} removed']))})."
+        )
 
     # Go from the renaming screen to the starting screen
     def go_back_screen(self):
@@ -985,32 +1217,167 @@ class Application:
     # ------------------------------------------------------------------------------------------------------------------------------------------------------------------ #
 
 
+# List with the place, name, score and score details of every variant, drawn as text items on a canvas.
+# Only the rows inside the visible part of the canvas have items, which are reused while scrolling, so sorting, filtering and resizing don't create any widgets
+class RankingList:
+    def __init__(self, parent, rows, button_style, row_height=75):
+        self.rows = rows  # (place, name, points, details) of every variant, by place
+        self.shown_rows = list(rows)  # Rows left by the filter, in the chosen order
+        self.row_height = row_height
+        self.sort_key = "place"  # Column the rows are sorted by
+        self.row_items = []  # Canvas items (name, score, details, separator) of each row that can be visible at once
+
+        # Sorting and filtering controls
+        self.controls = tk.Frame(parent, bg="#282D2F")
+        self.controls.pack(side=tk.TOP, fill="x", pady=(0, 10))
+        self.filter_text = tk.StringVar()
+        self.filter_text.trace_add("write", lambda *args: self.update_rows())
+        tk.Label(
+            self.controls,
+            text="Filter:",
+            font=("Helvetica", 14),
+            background="#282D2F",
+            foreground="#E0E0E0",
+        ).pack(side=tk.LEFT)
+        tk.Entry(
+            self.controls,
+            textvariable=self.filter_text,
+            font=("Helvetica", 14),
+            bg="#50565B",
+            fg="#E0E0E0",
+            insertbackground="#E0E0E0",
+            bd=0,
+        ).pack(side=tk.LEFT, padx=10)
+        self.sort_buttons = {}
+        for key, text in (("place", "Sort by score"), ("name", "Sort by name")):
+            self.sort_buttons[key] = tk.Button(
+                self.controls,
+                text=text,
+                font=("Helvetica", 14),
+                command=lambda key=key: self.sort(key),
+                **button_style,
+            )
+            self.sort_buttons[key].pack(side=tk.RIGHT, padx=(10, 0))
+
+        # Scrolled canvas with the rows
+        self.canvas = tk.Canvas(parent, bg="#50565B", highlightthickness=0)
+        self.scrollbar = tk.Scrollbar(
+            parent,
+            orient="vertical",
+            command=self.yview,
+            bg="#50565B",
+            troughcolor="#383D3F",
+        )
+        self.scrollbar.pack(side=tk.RIGHT, fill="y")
+        self.canvas.pack(side=tk.LEFT, expand=True, fill="both")
+        self.canvas.config(yscrollcommand=self.scrollbar.set, yscrollincrement=row_height // 3)
+        self.canvas.bind("<Configure>", lambda e: self.update_scrollregion())
+        self.canvas.bind_all(
+            "<MouseWheel>",
+            lambda e: self.yview("scroll", int(-1 * (e.delta / 60)), "units"),
+        )
+        self.canvas.bind_all("<Button-4>", lambda e: self.yview("scroll", -1, "units"))
+        self.canvas.bind_all("<Button-5>", lambda e: self.yview("scroll", 1, "units"))
+        self.update_scrollregion()
+
+    # Scroll the canvas (also used by the scrollbar) and draw the rows that became visible
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.draw_rows()
+
+    # Sort the rows by place or name, keeping the filter
+    def sort(self, key):
+        self.sort_key = key
+        self.update_rows()
+
+    # Apply the filter and the order to the rows and go back to the top of the list
+    def update_rows(self):
+        text = self.filter_text.get().lower()
+        self.shown_rows = [row for row in self.rows if text in row[1].lower()]
+        if self.sort_key == "name":
+            self.shown_rows.sort(key=lambda row: row[1].lower())
+        self.canvas.yview_moveto(0)
+        self.update_scrollregion()
+
+    # Make the scroll region fit the shown rows and create enough row items to fill the canvas
+    def update_scrollregion(self):
+        height = max(len(self.shown_rows) * self.row_height, self.canvas.winfo_height())
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), height))
+        while len(self.row_items) < self.canvas.winfo_height() // self.row_height + 2:
+            self.row_items.append(
+                (
+                    self.canvas.create_text(
+                        0, 0, anchor="w", font=("Helvetica", 24), fill="#E0E0E0"
+                    ),
+                    self.canvas.create_text(
+                        0, 0, anchor="e", font=("Helvetica", 24), fill="#E0E0E0"
+                    ),
+                    self.canvas.create_text(
+                        0, 0, anchor="e", font=("Helvetica", 10), fill="#B0B5B8"
+                    ),
+                    self.canvas.create_line(0, 0, 0, 0, fill="#383D3F", width=2),
+                )
+            )
+        self.draw_rows()
+
+    # Move the row items to the rows inside the visible part of the canvas and set their text
+    def draw_rows(self):
+        width = self.canvas.winfo_width()
+        first_row = int(self.canvas.canvasy(0) // self.row_height)
+        for offset, items in enumerate(self.row_items):
+            name_item, score_item, details_item, line_item = items
+            row_index = first_row + offset
+            if row_index >= len(self.shown_rows):
+                for item in items:
+                    self.canvas.itemconfig(item, state="hidden")
+                continue
+            place, name, points, details = self.shown_rows[row_index]
+            top = row_index * self.row_height
+            self.canvas.coords(name_item, 14, top + self.row_height / 2)
+            self.canvas.coords(score_item, width - 14, top + self.row_height * 0.4)
+            self.canvas.coords(details_item, width - 14, top + self.row_height * 0.8)
+            self.canvas.coords(line_item, 4, top + self.row_height, width - 4, top + self.row_height)
+            self.canvas.itemconfig(name_item, text=f"{place}. {name}", state="normal")
+            self.canvas.itemconfig(score_item, text=f"Score: {points}", state="normal")
+            self.canvas.itemconfig(details_item, text=details, state="normal")
+            # No separator under the last row
+            self.canvas.itemconfig(
+                line_item,
+                state="hidden" if row_index == len(self.shown_rows) - 1 else "normal",
+            )
+
+
 # Class for the pages of the levels
 class Level:
-    def __init__(self, app_object, page_images):
-        self.slotted_image_list = [
-            0
-        ] * app_object.total_variants_count  # List with all slots and the image they contain
-        self.photos_list = (
-            []
-        )  # List of ImageTk.PhotoImage objects of the resized images
-        self.photos_list_resized = []  # List of ImageTk.PhotoImage objects
-        self.images_list_original = []  # List of the images with their original size
+    def __init__(self, app_object, page_images, prepared_level, level_state):
+        self.level_state = level_state  # LevelState with the variant in each slot
+        self.photos_list_resized = []  # List of ImageTk.PhotoImage objects, None for the images outside the visible part of the canvas
+        self.photo_sources = []  # Image each PhotoImage was created from, to know when it needs to be created again
+        self.pyramids_list = []  # List of the ImagePyramid of each image, with the original size and smaller copies used for every resize
         self.images_list_resized = (
             []
         )  # List of the images after resizing to fit in the slots
         self.image_objects_list = []  # List with all objects of each image of the page
-        self.spawnpoint_list = [
-            (0, 0)
-        ]  # List of generated spawn coordinates for each image of the page
+        self.spawnpoint_list = []  # List of generated spawn coordinates for each image of the page
         self.app_object = app_object  # Application class object
         self.page_images = page_images  # List with the images of the current page
+        self.prepared_level = prepared_level  # Images of the page loaded by the LevelPrefetcher
+        self.preview_job = None  # Scheduled low quality resize while the window is being resized
+        self.refine_job = None  # Scheduled high quality resize for when the window stops changing size
+        self.refine_future = None  # High quality resize running in the background
+        self.resize_generation = 0  # Increased on every size change, so older resizes are discarded
+        self.offscreen = set()  # Images shrunk to a small rendition after leaving the visible part of the canvas
+        self.rendition_pending = set()  # Images being resized to the slot size again after coming back into view
+        self.images_released = False  # If the images were released by the ResidencyManager
+        self.comparison = None  # MergeInsertion with the pairs left to compare, None when the images are in the slot column
+        self.pyramid_futures = {}  # Variant index and the future building its pyramid in the background
+        self.zoom_view = None  # ZoomView of the image zoomed in, None if no image is
 
         # Creating and loading page widgets
         self.canvas = tk.Canvas(
             self.app_object.root, bg="#282D2F", highlightthickness=0
         )
-        self.canvas.pack(anchor="nw", side=tk.LEFT, padx=(0, 50), fill="both")
+        self.canvas.pack(anchor="nw", side=tk.LEFT, fill="both", expand=True)
         self.app_object.start_container.lift()
         self.canvas.update()
         self.slot_background = self.canvas.create_rectangle(0, 0, 1, 1)
@@ -1020,86 +1387,178 @@ class Level:
         ]
 
         self.calculate_size()
+        self.displayed_resolution = self.image_resolution  # Resolution of the images on the canvas
         self.spawn_images()
+        self.prepared_level = None  # The images are kept by the lists of the level from now on
 
         self.canvas.itemconfig(self.slot_background, fill=self.color)
         self.tooltip = tk.Label(
             self.canvas,
             background=self.bright_color,
             foreground="#FFFFFF",
-            text="Drag images with left-click\nRight-click on images to zoom in\nThe higher the image, the higher the score",
+            text="Drag images with left-click\nHold right-click on images to zoom in, scroll to zoom further\nThe higher the image, the higher the score",
             font=("Helvetica", 10, "bold"),
         )
+        if self.content_height > self.canvas.winfo_height():
+            self.tooltip.config(
+                text=self.tooltip.cget("text") + "\nScroll to see every slot"
+            )
         self.tooltip.place(x=20, y=20)
         self.canvas.update()
         self.canvas.focus_set()
-        self.canvas.bind("<Configure>", lambda e: self.calculate_size(e, True))
+        self.canvas.bind("<Configure>", self.schedule_resize)
+        self.canvas.bind(
+            "<MouseWheel>", lambda e: self.wheel(e, -1 if e.delta > 0 else 1)
+        )
+        self.canvas.bind("<Button-4>", lambda e: self.wheel(e, -1))
+        self.canvas.bind("<Button-5>", lambda e: self.wheel(e, 1))
+
+        if self.app_object.comparison_mode and len(self.page_images) > 1:
+            self.start_comparison()
+
+    # Hide the slot column and show the images in pairs. The order is built with merge-insertion, which asks for close to the fewest comparisons possible
+    def start_comparison(self):
+        self.comparison = MergeInsertion(range(len(self.page_images)))
+        for image in self.image_objects_list:
+            self.canvas.itemconfig(image.image_id, state="hidden")
+        self.slot_text = self.tooltip.cget("text")
+        self.tooltip.config(text="Left-click on the better image")
+        self.pair_photos = [None, None]  # PhotoImages of the compared images
+        self.pair_items = [self.canvas.create_image(0, 0) for _ in range(2)]
+        for side, item in enumerate(self.pair_items):
+            self.canvas.tag_bind(item, "<Button-1>", lambda e, side=side: self.choose(side))
+        self.comparison_label = self.canvas.create_text(
+            0, 0, fill="#FFFFFF", font=("Helvetica", 16, "bold")
+        )
+        self.show_pair()
+
+    # Show the current pair side by side, resized from the pyramids of the level so nothing is decoded again
+    def show_pair(self):
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        resolution = self.app_object.fit_full_resolution(
+            max(width / 2 - 40, 1), max(height - 120, 1)
+        )
+        for side, variant in enumerate(self.comparison.pair):
+            image = self.pyramids_list[variant].resize_built(resolution)
+            if image is None:
+                # Enlarge the slot image until the pyramid is built on the pyramid workers, the Tk thread never decodes an original
+                image = self.images_list_resized[variant].resize(resolution, Image.BILINEAR)
+                if variant not in self.pyramid_futures:
+                    self.request_pyramid(
+                        variant, resolution, lambda variant=variant: self.pair_pyramid_ready(variant)
+                    )
+            self.pair_photos[side] = ImageTk.PhotoImage(image)
+            self.canvas.itemconfig(self.pair_items[side], image=self.pair_photos[side])
+            self.canvas.coords(
+                self.pair_items[side],
+                self.canvas.canvasx(width * (1 + 2 * side) / 4),
+                self.canvas.canvasy(height / 2),
+            )
+        self.canvas.coords(
+            self.comparison_label,
+            self.canvas.canvasx(width / 2),
+            self.canvas.canvasy(height - 30),
+        )
+        self.canvas.itemconfig(
+            self.comparison_label,
+            text=f"Comparison {self.comparison.comparisons + 1} of at most {merge_insertion_comparisons(len(self.page_images))}",
+        )
 
-    # Load the image files into image objects and get color for the background
+    # Show the pair again in full quality once the pyramid of one of its images is built, if it is still being compared
+    def pair_pyramid_ready(self, variant):
+        if self.comparison is not None and variant in (self.comparison.pair or ()):
+            self.show_pair()
+
+    # Runs when one image of the pair is clicked
+    def choose(self, side):
+        self.app_object.play_image_release()
+        self.comparison.answer(side == 0)
+        if self.comparison.finished():
+            self.finish_comparison()
+        else:
+            self.show_pair()
+
+    # Put the images in the slots in the chosen order and show the slot column, where the order can still be changed
+    def finish_comparison(self):
+        for item in self.pair_items + [self.comparison_label]:
+            self.canvas.delete(item)
+        self.pair_photos = self.pair_items = None
+        self.tooltip.config(text=self.slot_text)
+        for slot, variant in enumerate(self.comparison.order):
+            self.level_state.place(variant, slot)
+            image_id = self.image_objects_list[variant].image_id
+            self.canvas.coords(image_id, *self.slot_geometry.center(slot))
+            self.canvas.itemconfig(image_id, state="normal")
+        self.comparison = None
+        self.refresh_visible()
+        self.app_object.button_check()
+
+    # Create the image objects from the loaded images and get color for the background
+    @traced("spawn_images", lambda self: {"resolution": self.image_resolution, "images": len(self.page_images)})
     def spawn_images(self):
+        self.spawnpoint_list = self.spawn_points()
         for x, imagefile in enumerate(self.page_images):
-            self.random_spawn_points()
-            self.images_list_original.append(
-                Image.open(
-                    os.path.normpath(os.path.join(self.app_object.filepath, imagefile))
-                )
-            )
-            self.images_list_resized.append(
-                self.images_list_original[x].resize(
-                    (self.image_resolution[0], self.image_resolution[1])
-                )
-            )
-            self.photos_list.append(ImageTk.PhotoImage(self.images_list_resized[x]))
+            self.pyramids_list.append(self.prepared_level.pyramids[x])
+            # If the window changed since the images were loaded, they are stretched until the resize in the background is done
+            self.images_list_resized.append(self.prepared_level.images_resized[x])
+            # The PhotoImages are only created for the visible images by refresh_visible
+            self.photos_list_resized.append(None)
+            self.photo_sources.append(None)
             self.image_objects_list.append(
                 ImageClass(
                     self.canvas,
-                    self.photos_list,
+                    self.photos_list_resized,
                     x,
-                    self.spawnpoint_list[x + 1],
+                    self.spawnpoint_list[x],
                     self,
                     self.app_object,
                 )
             )
 
         # Get the average color of one of the page's images to set as background
-        self.colorgetter = self.images_list_resized[0].resize((1, 1))
-        self.avg_color = self.colorgetter.getpixel((0, 0))
+        self.avg_color = self.prepared_level.avg_color
         self.color = f"#{int(self.avg_color[0]*0.75):02x}{int(self.avg_color[1]*0.75):02x}{int(self.avg_color[2]*0.75):02x}"
         self.bright_color = (
             f"#{self.avg_color[0]:02x}{self.avg_color[1]:02x}{self.avg_color[2]:02x}"
         )
         self.canvas.config(bg=self.bright_color)
+        self.refresh_visible()
+        if self.prepared_level.resolution != self.image_resolution:
+            self.schedule_resize()
 
     # Calculate the maximum size available for the images at the current window size
-    def calculate_size(self, event=None, re_size=False):
-        resvertical = min(
-            self.canvas.winfo_height() / self.app_object.total_variants_count,
-            self.app_object.base_resolution[1],
-        )
-        reshorizontal = min(
-            self.canvas.winfo_width(), self.app_object.base_resolution[0]
-        )
-        bottleneck = min(
-            resvertical * self.app_object.aspectratio[0],
-            reshorizontal * self.app_object.aspectratio[1],
-        )
-        self.image_resolution = (
-            math.floor((bottleneck / self.app_object.aspectratio[1])),
-            math.floor(bottleneck / self.app_object.aspectratio[0]),
+    def calculate_size(self, event=None):
+        self.image_resolution = self.app_object.fit_resolution(
+            self.canvas.winfo_width(), self.canvas.winfo_height()
         )
         self.adjust_sizes()
-        if re_size:
-            self.re_size()
+
+    # Runs on every <Configure> event. The events are grouped so there is at most one preview per frame, and the high quality resize only runs once the size stops changing
+    def schedule_resize(self, event=None):
+        if self.preview_job is None:
+            self.preview_job = self.canvas.after(16, self.preview_size)
+        if self.refine_job is not None:
+            self.canvas.after_cancel(self.refine_job)
+        self.refine_job = self.canvas.after(150, self.re_size)
 
     # Change info about the coordinates of the slots and resolutions
+    @traced("adjust_sizes", lambda self: {"resolution": self.image_resolution})
     def adjust_sizes(self):
-        self.slot_centers_list = [
-            (
-                float((self.canvas.winfo_width()) / 2),
-                self.image_resolution[1] * x + self.image_resolution[1] / 2,
-            )
-            for x in range(self.app_object.total_variants_count)
-        ]
+        self.slot_geometry = SlotGeometry(
+            self.app_object.total_variants_count,
+            float((self.canvas.winfo_width()) / 2),
+            self.image_resolution[1],
+        )
+        # Height of the slot column, the canvas scrolls if it is taller than the window
+        self.content_height = max(
+            self.image_resolution[1] * self.app_object.total_variants_count,
+            self.canvas.winfo_height(),
+        )
+        self.canvas.config(
+            scrollregion=(0, 0, self.canvas.winfo_width(), self.content_height),
+            yscrollincrement=max(self.image_resolution[1] // 2, 1),
+        )
         for i, slot in enumerate(self.slot_border):
             self.canvas.coords(
                 slot,
@@ -1113,93 +1572,590 @@ class Level:
             (self.canvas.winfo_width() - self.image_resolution[0]) / 2,
             0,
             (self.canvas.winfo_width() + self.image_resolution[0]) / 2,
-            self.app_object.root.winfo_height(),
+            max(self.content_height, self.app_object.root.winfo_height()),
         )
 
         # Update info about the resolutions, sizes, slots coordinates after resizing
-        fullvertical = self.canvas.winfo_height()
-        fullhorizontal = self.canvas.winfo_width()
-        bottleneck = min(
-            fullvertical * self.app_object.aspectratio[0],
-            fullhorizontal * self.app_object.aspectratio[1],
-        )
-        self.full_image_resolution = (
-            math.floor((bottleneck / self.app_object.aspectratio[1])),
-            math.floor(bottleneck / self.app_object.aspectratio[0]),
+        self.full_image_resolution = self.app_object.fit_full_resolution(
+            self.canvas.winfo_width(), self.canvas.winfo_height()
         )
 
-        for i, image in enumerate(self.image_objects_list):
-            if image.image_id in self.slotted_image_list:
-                self.canvas.coords(
-                    image.image_id,
-                    self.slot_centers_list[
-                        self.slotted_image_list.index(image.image_id)
-                    ][0],
-                    self.slot_centers_list[
-                        self.slotted_image_list.index(image.image_id)
-                    ][1],
-                )
+        for image in self.image_objects_list:
+            image_slot = self.level_state.slot_of(image.variant)
+            if image_slot is not None:
+                self.canvas.coords(image.image_id, *self.slot_geometry.center(image_slot))
             image.outofbounds()
+        self.refresh_visible()
 
-    # Change size of the images
+    # Quickly resize the images with nearest neighbour while the window is changing size
+    @traced("preview_size", lambda self: {"resolution": self.image_resolution})
+    def preview_size(self):
+        self.preview_job = None
+        if self.images_released:
+            return
+        self.calculate_size()
+        if self.image_resolution == self.displayed_resolution:
+            return
+        self.resize_generation += 1  # Discard the high quality resizes for older sizes
+        self.displayed_resolution = self.image_resolution
+        self.refresh_visible()
+
+    # Start resizing the images in high quality in the background, after the window stopped changing size
+    @traced("re_size", lambda self: {"resolution": self.image_resolution})
     def re_size(self):
-        self.photos_list_resized.clear()
-        # If the new image size hasn't been loaded yet, it will use the original size as the base to not lose sharpness, but this is laggier
-        if self.image_resolution[0] > self.images_list_resized[0].size[0]:
-            for i, img in enumerate(self.images_list_resized):
-                self.images_list_resized[i] = self.images_list_original[i].resize(
-                    (self.image_resolution[0], self.image_resolution[1])
-                )
-                self.photos_list_resized.append(
-                    ImageTk.PhotoImage(self.images_list_resized[i])
-                )
-                self.image_objects_list[i].photo = self.photos_list_resized[i]
+        self.refine_job = None
+        if self.images_released:
+            return
+        if self.preview_job is not None:
+            self.canvas.after_cancel(self.preview_job)
+            self.preview_size()
+        # The zoom was laid out for the old window size
+        if self.zoom_view is not None:
+            self.zoom_view.close()
+        if self.comparison is not None:
+            self.show_pair()
+        # The images outside of the view keep their small rendition, they are resized when they come back into view
+        indices = [
+            i
+            for i, image in enumerate(self.images_list_resized)
+            if i not in self.offscreen and image.size != self.image_resolution
+        ]
+        if not indices:
+            return
+        if self.refine_future is not None:
+            self.refine_future.cancel()
+        self.refine_future = self.app_object.resize_executor.submit(
+            self.resize_images, self.image_resolution, self.resize_generation, indices
+        )
+        self.canvas.after(20, self.apply_resize, self.refine_future, self.resize_generation, indices)
+
+    # Resize the images with the given indices from their pyramids. Runs on the resize worker, so it can't use Tk
+    @traced("resize_images", lambda self, resolution, generation, indices: {"resolution": resolution, "images": len(indices)})
+    def resize_images(self, resolution, generation, indices):
+        images = {}
+        for i in indices:
+            # Stop if the window changed size again
+            if generation != self.resize_generation:
+                return None
+            images[i] = resize_cached(
+                self.pyramids_list[i], resolution, self.app_object.thumbnail_cache
+            )
+        return images
+
+    # Show the high quality images when they are ready, if the window didn't change size in the meantime
+    def apply_resize(self, future, generation, indices):
+        if not future.done():
+            self.canvas.after(20, self.apply_resize, future, generation, indices)
+            return
+        self.rendition_pending.difference_update(indices)
+        if generation != self.resize_generation or future.cancelled() or self.images_released:
+            # Images that came back into view are requested again for the new size
+            self.refresh_visible()
+            return
+        images = future.result()
+        if images is None:
+            return
+        for i, image in images.items():
+            self.images_list_resized[i] = image
+            self.offscreen.discard(i)
+        self.refresh_visible()
+
+    # Resolution of the rendition kept for the images outside of the visible part of the canvas
+    def offscreen_resolution(self):
+        return (
+            max(self.displayed_resolution[0] // 4, 1),
+            max(self.displayed_resolution[1] // 4, 1),
+        )
+
+    # Resize the images that came back into view to the slot size again, in the background
+    def request_renditions(self, indices):
+        indices = [i for i in indices if i not in self.rendition_pending]
+        if not indices:
+            return
+        self.rendition_pending.update(indices)
+        future = self.app_object.resize_executor.submit(
+            self.resize_images, self.image_resolution, self.resize_generation, indices
+        )
+        self.canvas.after(20, self.apply_resize, future, self.resize_generation, indices)
+
+    # Build the pyramid of an image on the pyramid workers, so the Tk thread never decodes an original. Runs callback once it covers the resolution
+    def request_pyramid(self, variant, resolution, callback):
+        future = self.pyramid_futures.get(variant)
+        if future is None:
+            future = self.pyramid_futures[variant] = self.app_object.pyramid_executor.submit(
+                self.pyramids_list[variant].build, resolution
+            )
+        self.canvas.after(20, self.check_pyramid, variant, future, resolution, callback)
+
+    def check_pyramid(self, variant, future, resolution, callback):
+        if not future.done():
+            self.canvas.after(20, self.check_pyramid, variant, future, resolution, callback)
+            return
+        if self.pyramid_futures.get(variant) is future:
+            del self.pyramid_futures[variant]
+        if future.cancelled() or future.exception() is not None or self.images_released:
+            return
+        # The pyramid may have been built for a smaller resolution by an earlier request
+        if not self.pyramids_list[variant].covers(resolution):
+            self.request_pyramid(variant, resolution, callback)
+            return
+        callback()
+
+    # Bytes used by the images of the level, including the PhotoImages
+    def memory_cost(self):
+        return (
+            sum(pyramid.memory_cost() for pyramid in self.pyramids_list)
+            + sum(image_cost(img) for img in self.images_list_resized)
+            + sum(photo_cost(photo) for photo in self.photos_list_resized)
+        )
+
+    # Free every image of a level that isn't being shown. Returns the number of bytes freed
+    def release_images(self):
+        if self.images_released:
+            return 0
+        freed = self.memory_cost()
+        # Cancel resizes and pyramid builds that were still scheduled or running for this level
+        self.resize_generation += 1
+        for job in (self.preview_job, self.refine_job):
+            if job is not None:
+                self.canvas.after_cancel(job)
+        self.preview_job = self.refine_job = None
+        for future in self.pyramid_futures.values():
+            future.cancel()
+        self.pyramid_futures = {}
+        for image_object in self.image_objects_list:
+            self.canvas.itemconfig(image_object.image_id, image="")
+            image_object.photo = None
+        for pyramid in self.pyramids_list:
+            pyramid.release()
+        self.images_list_resized = []
+        self.photos_list_resized = [None] * len(self.image_objects_list)
+        self.photo_sources = [None] * len(self.image_objects_list)
+        self.offscreen = set()
+        self.rendition_pending = set()
+        self.images_released = True
+        return freed
+
+    # Free only the decoded originals, the images on the canvas are kept. Returns the number of bytes freed
+    def release_originals(self):
+        return sum(pyramid.release() for pyramid in self.pyramids_list)
+
+    # Use the images loaded again by the LevelPrefetcher after they were released
+    def restore_images(self, prepared_level):
+        self.images_released = False
+        self.pyramids_list = prepared_level.pyramids
+        for image_object, pyramid in zip(self.image_objects_list, self.pyramids_list):
+            image_object.pyramid = pyramid
+        self.images_list_resized = list(prepared_level.images_resized)
+        self.offscreen = set()
+        self.rendition_pending = set()
+        self.displayed_resolution = self.image_resolution
+        self.refresh_visible()
+        # The window may have changed size since they were loaded
+        if prepared_level.resolution != self.image_resolution:
+            self.schedule_resize()
+
+    # Create the PhotoImages of the images inside the visible part of the canvas and free the ones outside of it, so the cost doesn't grow with the number of variants.
+    # The images outside of it are also shrunk to a small rendition, and resized to the slot size again when they come back into view
+    def refresh_visible(self):
+        if (
+            self.images_released
+            or not self.image_objects_list
+            or len(self.images_list_resized) < len(self.image_objects_list)
+        ):
+            return
+        top = self.canvas.canvasy(0) - self.displayed_resolution[1]
+        bottom = self.canvas.canvasy(self.canvas.winfo_height()) + self.displayed_resolution[1]
+        returned = []
+        for i, image_object in enumerate(self.image_objects_list):
+            source = self.images_list_resized[i]
+            if top <= self.canvas.coords(image_object.image_id)[1] <= bottom:
+                if i in self.offscreen:
+                    returned.append(i)
+                if (
+                    self.photos_list_resized[i] is not None
+                    and self.photo_sources[i] is source
+                    and self.photos_list_resized[i].width() == self.displayed_resolution[0]
+                    and self.photos_list_resized[i].height() == self.displayed_resolution[1]
+                ):
+                    continue
+                # Use nearest neighbour until the high quality image for the new size is ready
+                if source.size != self.displayed_resolution:
+                    source_image = source.resize(self.displayed_resolution, Image.NEAREST)
+                else:
+                    source_image = source
+                self.photos_list_resized[i] = ImageTk.PhotoImage(source_image)
+                self.photo_sources[i] = source
+            else:
+                if i not in self.offscreen and i not in self.rendition_pending:
+                    self.images_list_resized[i] = source.resize(
+                        self.offscreen_resolution(), Image.BILINEAR
+                    )
+                    self.offscreen.add(i)
+                if self.photos_list_resized[i] is None:
+                    continue
+                self.photos_list_resized[i] = None
+                self.photo_sources[i] = None
+            image_object.photo = self.photos_list_resized[i]
+            # Don't replace the bigger image shown while the image is grabbed
+            if not image_object.enlarged:
                 self.canvas.itemconfig(
-                    self.image_objects_list[i].image_id,
-                    image=self.photos_list_resized[i],
+                    image_object.image_id, image=image_object.photo or ""
                 )
-        # Uses resized images as the base for the resizing (less lag)
+        self.request_renditions(returned)
+
+    # The mouse wheel zooms the zoomed in image, or scrolls the level
+    def wheel(self, event, units):
+        if self.zoom_view is not None:
+            self.zoom_view.zoom(-units, event.x, event.y)
         else:
-            for i, img in enumerate(self.images_list_resized):
-                img = img.resize((self.image_resolution[0], self.image_resolution[1]))
-                self.photos_list_resized.append(ImageTk.PhotoImage(img))
-                self.image_objects_list[i].photo = self.photos_list_resized[i]
-                self.canvas.itemconfig(
-                    self.image_objects_list[i].image_id,
-                    image=self.photos_list_resized[i],
-                )
+            self.scroll(units)
 
-    # Calculate the spawn coordinates randomly for one image
-    def random_spawn_points(self):
-        # Define if image will be on left or right side
-        while True:
-            if random.randint(0, 1) % 2 == 0:
-                self.spawn_point_x = random.randint(
-                    int(self.image_resolution[0] * 2 + self.image_resolution[0]),
-                    int(self.image_resolution[0] * 4 - self.image_resolution[0] / 2),
-                )
-            else:
-                self.spawn_point_x = random.randint(
-                    int(self.image_resolution[0] / 2),
-                    int(self.image_resolution[0] * 2 - self.image_resolution[0]),
-                )
+    # Scroll the canvas when the slots don't fit in the window
+    def scroll(self, units):
+        if self.content_height <= self.canvas.winfo_height() or self.comparison is not None:
+            return
+        self.canvas.yview_scroll(units, "units")
+        self.refresh_visible()
+
+    # Spawn points of the images, on the left and right of the slot column. The layout always ends, if the images don't fit apart they overlap
+    def spawn_points(self):
+        width, height = self.image_resolution
+        layout = SpawnLayout(
+            [
+                (width / 2, height / 2, width, self.content_height - height / 2),
+                (width * 3, height / 2, width * 3.5, self.content_height - height / 2),
+            ],
+            height,
+            # Every level gets its own layout from the same seed
+            None
+            if self.app_object.spawn_seed is None
+            else f"{self.app_object.spawn_seed}:{self.app_object.current_page}",
+        )
+        return layout.spawn(len(self.page_images))
+
+
+# Deep zoom of one image over the visible part of a level, opened by right-clicking on the image.
+# The image is drawn from tiles decoded at the level of detail of the zoom, so only the visible part is resized and turned into PhotoImages. The tiles are loaded and resized on the tile workers, and the tiles around the window are loaded in advance.
+# The mouse wheel zooms in around the cursor and dragging with either button moves the image. Until the tiles are ready, the part of the image is stretched from its pyramid
+class ZoomView:
+    def __init__(self, canvas, pyramid, slot_image, fit_resolution, app_object, on_close, start_position):
+        self.canvas = canvas
+        self.app_object = app_object
+        self.on_close = on_close  # Runs when the view is closed
+        # Biggest copy of the pyramid if it is built, otherwise the image of the slot, which the tiles replace. Nothing is decoded on the Tk thread
+        self.preview_source = pyramid.levels[0] if pyramid.covers(fit_resolution) else slot_image
+        self.tiled = TiledImage(pyramid.path, app_object.tile_cache, full_size=pyramid.full_size)
+        self.full_size = self.tiled.full_size
+        self.width = canvas.winfo_width()
+        self.height = canvas.winfo_height()
+        self.left = int(canvas.canvasx(0))  # Canvas coordinates of the top left corner of the window
+        self.top = int(canvas.canvasy(0))
+        self.fit_scale = min(
+            fit_resolution[0] / self.full_size[0], fit_resolution[1] / self.full_size[1]
+        )  # Pixels of the screen for each pixel of the original when the whole image fits in the window
+        self.scale = self.fit_scale
+        self.max_scale = max(8, self.fit_scale)  # Zoom where every pixel of the original is 8 pixels of the screen
+        self.origin = self.centered_origin()  # Canvas coordinates of the top left corner of the image
+        self.pinned = False  # If the image was zoomed with the wheel, then the view stays open when the right button is released
+        self.tiles = {}  # (level, column, row) and the canvas item and PhotoImage of the tiles being shown, or of their parts past 1:1
+        self.futures = {}  # (level, column, row) and the future with the resized tile, with its position relative to the origin
+        self.prefetched = set()  # (level, column, row) of the tiles already queued to be loaded in advance
+        self.poll_job = None  # Scheduled check of the tile futures
+        self.pan_job = None  # Scheduled canvas update while dragging
+        self.pan_position = start_position  # Cursor position the image was last moved to
+        self.pan_target = None  # Latest cursor position that wasn't applied yet
+        self.zoom_job = None  # Scheduled zoom while the wheel is turning
+        self.zoom_steps = 0  # Wheel steps that weren't applied yet
+        self.zoom_position = None
+        self.preview_photo = None
+        self.preview_box = None  # Canvas coordinates covered by the stretched image
+        self.background = canvas.create_rectangle(
+            self.left,
+            self.top,
+            self.left + self.width,
+            self.top + self.height,
+            fill=app_object.background_color,
+            width=0,
+            tags="zoom",
+        )
+        self.preview = canvas.create_image(0, 0, anchor="nw", tags=("zoom", "zoom_image"))
+        canvas.bind("<Button-1>", lambda e: self.start_pan(e))
+        canvas.bind("<B1-Motion>", lambda e: self.pan(e))
+        canvas.bind("<B3-Motion>", lambda e: self.pan(e))
+        canvas.bind("<ButtonRelease-1>", lambda e: self.render_preview())
+        canvas.bind("<Button-3>", lambda e: self.right_click())
+        canvas.bind("<Escape>", lambda e: self.close())
+        self.render()
+
+    # Zoom with the mouse wheel, keeping the point under the cursor in place. The wheel steps are applied at most once per frame
+    def zoom(self, steps, x, y):
+        self.pinned = True
+        self.zoom_steps += steps
+        self.zoom_position = (x, y)
+        if self.zoom_job is None:
+            self.zoom_job = self.canvas.after(
+                int(self.app_object.frame_interval * 1000), self.apply_zoom
+            )
 
-            self.spawn_point_y = random.randint(
-                int(self.image_resolution[1] / 2),
-                int(
-                    self.image_resolution[1] * self.app_object.total_variants_count
-                    - self.image_resolution[1] / 2
+    def apply_zoom(self):
+        self.zoom_job = None
+        scale = min(max(self.scale * 1.25**self.zoom_steps, self.fit_scale), self.max_scale)
+        self.zoom_steps = 0
+        if scale == self.scale:
+            return
+        cursor_x = self.left + self.zoom_position[0]
+        cursor_y = self.top + self.zoom_position[1]
+        self.origin = self.clamp_origin(
+            math.floor(cursor_x - (cursor_x - self.origin[0]) * scale / self.scale),
+            math.floor(cursor_y - (cursor_y - self.origin[1]) * scale / self.scale),
+            scale,
+        )
+        self.scale = scale
+        # Center the image again when it fits the window
+        if scale == self.fit_scale:
+            self.origin = self.centered_origin()
+        self.render()
+
+    def centered_origin(self):
+        return (
+            self.left + (self.width - round(self.full_size[0] * self.scale)) // 2,
+            self.top + (self.height - round(self.full_size[1] * self.scale)) // 2,
+        )
+
+    # Keep the center of the window inside the image
+    def clamp_origin(self, x, y, scale):
+        center_x = self.left + self.width // 2
+        center_y = self.top + self.height // 2
+        return (
+            min(max(x, center_x - round(self.full_size[0] * scale)), center_x),
+            min(max(y, center_y - round(self.full_size[1] * scale)), center_y),
+        )
+
+    def start_pan(self, event):
+        self.pan_position = (event.x, event.y)
+
+    # Runs when the image is dragged. Only the latest position is saved, the image is moved at most once per frame
+    def pan(self, event):
+        self.pan_target = (event.x, event.y)
+        if self.pan_job is None:
+            self.pan_job = self.canvas.after(
+                int(self.app_object.frame_interval * 1000), self.apply_pan
+            )
+
+    # Move the image and its tiles to the latest cursor position, then load the tiles that became visible
+    @traced("zoom_pan", lambda self: {"scale": self.scale, "tiles": len(self.tiles)})
+    def apply_pan(self):
+        self.pan_job = None
+        if self.pan_target is None:
+            return
+        if self.pan_position is None:
+            self.pan_position = self.pan_target
+        origin = self.clamp_origin(
+            self.origin[0] + self.pan_target[0] - self.pan_position[0],
+            self.origin[1] + self.pan_target[1] - self.pan_position[1],
+            self.scale,
+        )
+        self.pan_position = self.pan_target
+        self.pan_target = None
+        dx, dy = origin[0] - self.origin[0], origin[1] - self.origin[1]
+        if not dx and not dy:
+            return
+        self.origin = origin
+        self.canvas.move("zoom_image", dx, dy)
+        if self.preview_box is not None:
+            self.preview_box = (
+                self.preview_box[0] + dx,
+                self.preview_box[1] + dy,
+                self.preview_box[2] + dx,
+                self.preview_box[3] + dy,
+            )
+        # Stretch the image again only when the window moved past the part that was stretched
+        visible = self.screen_box(0)
+        if visible is not None and (
+            self.preview_box is None
+            or visible[0] < self.preview_box[0]
+            or visible[1] < self.preview_box[1]
+            or visible[2] > self.preview_box[2]
+            or visible[3] > self.preview_box[3]
+        ):
+            self.render_preview()
+        self.request_tiles()
+
+    # Canvas coordinates of the part of the image inside the window, grown by margin pixels on every side. None if the image is outside of it
+    def screen_box(self, margin):
+        box = (
+            max(self.left - margin, self.origin[0]),
+            max(self.top - margin, self.origin[1]),
+            min(self.left + self.width + margin, self.origin[0] + round(self.full_size[0] * self.scale)),
+            min(self.top + self.height + margin, self.origin[1] + round(self.full_size[1] * self.scale)),
+        )
+        if box[2] <= box[0] or box[3] <= box[1]:
+            return None
+        return box
+
+    # Draw the image at the current zoom, dropping the tiles of the previous one
+    @traced("zoom_render", lambda self: {"scale": self.scale, "source_size": self.full_size})
+    def render(self):
+        for future, _ in self.futures.values():
+            future.cancel()
+        self.futures = {}
+        for item, _ in self.tiles.values():
+            self.canvas.delete(item)
+        self.tiles = {}
+        self.render_preview()
+        self.request_tiles()
+
+    # Stretch the part of the image around the window from the pyramid. It is shown under the tiles, so it is only seen while they are loading
+    def render_preview(self):
+        box = self.screen_box(max(self.width, self.height) // 4)
+        self.preview_box = box
+        if box is None:
+            self.canvas.itemconfig(self.preview, image="")
+            self.preview_photo = None
+            return
+        factor = self.preview_source.width / self.full_size[0] / self.scale  # Pixels of the pyramid copy for each pixel of the screen
+        self.preview_photo = ImageTk.PhotoImage(
+            self.preview_source.resize(
+                (box[2] - box[0], box[3] - box[1]),
+                Image.BILINEAR,
+                # Rounding can put the edges a fraction of a pixel outside of the copy
+                box=(
+                    max((box[0] - self.origin[0]) * factor, 0),
+                    max((box[1] - self.origin[1]) * factor, 0),
+                    min((box[2] - self.origin[0]) * factor, self.preview_source.width),
+                    min((box[3] - self.origin[1]) * factor, self.preview_source.height),
                 ),
             )
+        )
+        self.canvas.itemconfig(self.preview, image=self.preview_photo)
+        self.canvas.coords(self.preview, box[0], box[1])
 
-            # Check if images are far enough apart for each other
-            self.distances = [
-                math.dist((self.spawn_point_x, self.spawn_point_y), p)
-                for p in self.spawnpoint_list
-            ]
-            if min(self.distances) > self.image_resolution[1]:
-                self.spawnpoint_list.append((self.spawn_point_x, self.spawn_point_y))
+    # Queue the visible tiles that aren't shown yet and the tiles around them, and drop the tiles far from the window
+    def request_tiles(self):
+        # The pyramid copy is already as sharp as the screen
+        if self.scale * self.full_size[0] <= self.preview_source.width:
+            return
+        level = self.tiled.level_for(self.scale)
+        columns, rows = self.tiled.grid(level)
+        level_width, level_height = self.tiled.level_size(level)
+        scale_x = self.scale * self.full_size[0] / level_width  # Pixels of the screen for each pixel of the level
+        scale_y = self.scale * self.full_size[1] / level_height
+        tile_size = self.tiled.tile_size
+        # Past 1:1 each tile is shown in parts, so no part is bigger than a tile on the screen, instead of enlarging the whole tile at once
+        split = 1 if self.scale <= 1 else min(2 ** math.ceil(math.log2(self.scale)), tile_size)
+        part_size = tile_size // split  # Pixels of the level in each part
+        part_columns, part_rows = columns * split, rows * split
+        first_column = max(int((self.left - self.origin[0]) / scale_x // part_size), 0)
+        first_row = max(int((self.top - self.origin[1]) / scale_y // part_size), 0)
+        last_column = min(int((self.left + self.width - self.origin[0]) / scale_x // part_size), part_columns - 1)
+        last_row = min(int((self.top + self.height - self.origin[1]) / scale_y // part_size), part_rows - 1)
+        visible = [
+            (level, column, row)
+            for row in range(first_row, last_row + 1)
+            for column in range(first_column, last_column + 1)
+        ]
+        # Load the parts at the center of the window first
+        center = ((first_column + last_column) / 2, (first_row + last_row) / 2)
+        visible.sort(key=lambda part: abs(part[1] - center[0]) + abs(part[2] - center[1]))
+        for key in visible:
+            if key in self.tiles or key in self.futures:
+                continue
+            _, column, row = key
+            tile_left, tile_top, tile_right, tile_bottom = self.tiled.tile_box(level, column // split, row // split)
+            left = column * part_size
+            top = row * part_size
+            right = min(left + part_size, tile_right)
+            bottom = min(top + part_size, tile_bottom)
+            # Levels whose size isn't a multiple of a part have no pixels in the last parts of their last tile
+            if right <= left or bottom <= top:
+                continue
+            position = (round(left * scale_x), round(top * scale_y))
+            size = (round(right * scale_x) - position[0], round(bottom * scale_y) - position[1])
+            box = (left - tile_left, top - tile_top, right - tile_left, bottom - tile_top)
+            self.futures[key] = (
+                self.app_object.tile_executor.submit(
+                    render_tile, self.tiled, level, column // split, row // split, size, box
+                ),
+                position,
+            )
+
+        # Parts one step outside of the window are kept on the canvas, and their tiles are loaded in advance
+        nearby = [
+            (column, row)
+            for row in range(max(first_row - 1, 0), min(last_row + 2, part_rows))
+            for column in range(max(first_column - 1, 0), min(last_column + 2, part_columns))
+        ]
+        visible_tiles = {(level, column // split, row // split) for _, column, row in visible}
+        prefetch = sorted(
+            {
+                (column // split, row // split)
+                for column, row in nearby
+                if (level, column // split, row // split) not in self.prefetched
+                and (level, column // split, row // split) not in visible_tiles
+            }
+        )
+        if prefetch:
+            self.prefetched.update((level, *tile) for tile in prefetch)
+            self.app_object.tile_executor.submit(self.tiled.load, level, prefetch)
+        kept = {(level, *part) for part in nearby}
+        for key in list(self.tiles):
+            if key not in kept:
+                self.canvas.delete(self.tiles.pop(key)[0])
+        for key in list(self.futures):
+            if key not in kept and self.futures[key][0].cancel():
+                del self.futures[key]
+        if self.futures and self.poll_job is None:
+            self.poll_job = self.canvas.after(
+                int(self.app_object.frame_interval * 1000), self.show_tiles
+            )
+
+    # Show the tiles that finished resizing. Creating the PhotoImages takes at most half of a frame, the rest wait for the next one
+    def show_tiles(self):
+        self.poll_job = None
+        start = time.perf_counter()
+        for key in list(self.futures):
+            future, position = self.futures[key]
+            if not future.done():
+                continue
+            del self.futures[key]
+            if future.cancelled() or future.exception() is not None:
+                continue
+            photo = ImageTk.PhotoImage(future.result())
+            item = self.canvas.create_image(
+                self.origin[0] + position[0],
+                self.origin[1] + position[1],
+                anchor="nw",
+                image=photo,
+                tags=("zoom", "zoom_image"),
+            )
+            self.tiles[key] = (item, photo)
+            if time.perf_counter() - start > self.app_object.frame_interval / 2:
                 break
+        if self.futures:
+            self.poll_job = self.canvas.after(
+                int(self.app_object.frame_interval * 1000), self.show_tiles
+            )
+
+    # A right-click closes the view once it stays open. While it doesn't, the right button is still held
+    def right_click(self):
+        if self.pinned:
+            self.close()
+
+    # Remove the view and free its PhotoImages. The tiles stay in the TileCache
+    def close(self):
+        for job in (self.poll_job, self.pan_job, self.zoom_job):
+            if job is not None:
+                self.canvas.after_cancel(job)
+        for future, _ in self.futures.values():
+            future.cancel()
+        self.futures = {}
+        self.tiles = {}
+        self.preview_photo = None
+        self.canvas.delete("zoom")
+        for sequence in ("<Button-1>", "<B1-Motion>", "<B3-Motion>", "<ButtonRelease-1>", "<Button-3>", "<Escape>"):
+            self.canvas.unbind(sequence)
+        self.on_close()
 
 
 class ImageClass:
@@ -1207,7 +2163,14 @@ class ImageClass:
         self, canvas, photos_list, object_index, spawn_point, page_class, app_object
     ):
         self.photo = photos_list[object_index]  # PhotoImage object of current image
-        self.image = page_class.images_list_original[object_index]  # Current image file
+        self.variant = object_index  # Index of the variant of the image
+        self.drag_job = None  # Scheduled canvas update while dragging
+        self.drag_position = None  # Latest cursor position that wasn't applied yet
+        self.drag_event_time = None  # When the oldest motion event that wasn't applied yet arrived
+        self.last_drag_frame = 0  # When the image was last moved
+        self.enlarged = False  # If the image is grabbed and shows a bigger copy
+        self.zoom_view = None  # ZoomView of the image while it is zoomed in
+        self.pyramid = page_class.pyramids_list[object_index]  # Smaller copies of the image used for resizing
         self.canvas = canvas
         self.page_class = page_class
         self.app_object = app_object
@@ -1241,39 +2204,40 @@ class ImageClass:
         )
         self.y_coordinate = min(
             self.y_coordinate,
-            self.canvas.winfo_height() - self.page_class.image_resolution[1] / 2,
+            max(self.page_class.content_height, self.canvas.winfo_height())
+            - self.page_class.image_resolution[1] / 2,
         )
 
         self.canvas.coords(self.image_id, self.x_coordinate, self.y_coordinate)
 
-    # Zoom in right-clicked image to fit the entire screen
+    # Open the deep zoom of the right-clicked image, fitting the entire screen. It closes when the button is released, unless it was zoomed with the wheel
+    @traced("full_image", lambda self, event: {"resolution": self.page_class.full_image_resolution, "source_size": self.pyramid.full_size})
     def full_image(self, event):
+        if self.page_class.zoom_view is not None:
+            return
         # Disable image grabbing when zoomed in
         self.canvas.tag_unbind(self.image_id, "<Button1-Motion>")
         self.canvas.tag_unbind(self.image_id, "<Button-1>")
         self.canvas.tag_unbind(self.image_id, "<ButtonRelease-1>")
+        self.page_class.zoom_view = ZoomView(
+            self.canvas,
+            self.pyramid,
+            self.page_class.images_list_resized[self.variant],
+            self.page_class.full_image_resolution,
+            self.app_object,
+            self.zoom_closed,
+            (event.x, event.y),
+        )
+        self.zoom_view = self.page_class.zoom_view
 
-        self.selected_x, self.selected_y = self.canvas.coords(
-            self.image_id
-        )  # Remember position of the image
-        self.canvas.tag_raise(self.image_id)  # Move image to the front
-        self.canvas.coords(
-            self.image_id, self.canvas.winfo_width() / 2, self.canvas.winfo_height() / 2
-        )  # Center image before zooming
-
-        # Zoom image to the max possible size
-        self.fulledimage = self.image.resize(self.page_class.full_image_resolution)
-        self.fulledimage_photo = ImageTk.PhotoImage(self.fulledimage)
-        self.canvas.itemconfig(self.image_id, image=self.fulledimage_photo)
-
-    # Remove fully zoomed image from screen
+    # Close the zoom when the right button is released
     def full_image_close(self, event):
-        self.canvas.itemconfig(
-            self.image_id, image=self.photo
-        )  # Set image to original size
-        self.canvas.coords(
-            self.image_id, self.selected_x, self.selected_y
-        )  # Put the image in the position it was before zoom
+        if self.zoom_view is not None and not self.zoom_view.pinned:
+            self.zoom_view.close()
+
+    # Runs when the zoom of this image was closed
+    def zoom_closed(self):
+        self.zoom_view = self.page_class.zoom_view = None
 
         # Enable grabbing images again
         self.canvas.tag_bind(
@@ -1283,77 +2247,48 @@ class ImageClass:
         self.canvas.tag_bind(self.image_id, "<ButtonRelease-1>", self.mouse_release)
 
     # What happens when an image is released
+    @traced("mouse_release", lambda self, event: {"resolution": self.page_class.image_resolution})
     def mouse_release(self, event):
+        # Move the image to the last cursor position before checking the slots
+        if self.drag_job is not None:
+            self.canvas.after_cancel(self.drag_job)
+            self.apply_drag()
+            # Stop the scrolling at the edge of the window
+            if self.drag_job is not None:
+                self.canvas.after_cancel(self.drag_job)
+                self.drag_job = None
+            self.drag_position = None
+        self.enlarged = False
         self.canvas.itemconfig(
-            self.image_id, image=self.photo
+            self.image_id, image=self.photo or ""
         )  # Return image to original size
+        self.selectedimage = self.selectedimage_photo = None  # Free the increased image
         self.outofbounds()  # Check if image is outside of canvas
 
-        # Calculate distance of the image to the closest slot
-        self.closest_center = min(
-            self.page_class.slot_centers_list,
-            key=lambda center: math.dist(center, self.canvas.coords(self.image_id)),
-        )
+        # Find the slot the image is over, if it is close enough to its center
+        put_in = self.page_class.slot_geometry.snap(*self.canvas.coords(self.image_id))
 
         # Teleport image into slot if close enough
-        if (
-            math.dist(self.closest_center, self.canvas.coords(self.image_id))
-            < self.page_class.image_resolution[1]
-        ):
+        if put_in is not None:
             self.app_object.play_image_release()
-            put_in = self.page_class.slot_centers_list.index(
-                (self.closest_center[0], self.closest_center[1])
-            )
 
-            # If there was no image in the slot previously
-            if self.page_class.slotted_image_list[put_in] == 0:
-                self.page_class.slotted_image_list[put_in] = self.image_id
+            # Put the image in the slot, shifting the other images if it was taken
+            moved = self.page_class.level_state.place(self.variant, put_in)
+
+            # Re-position only the images that changed slot
+            for variant in moved:
                 self.canvas.coords(
-                    self.image_id, self.closest_center[0], self.closest_center[1]
+                    self.page_class.image_objects_list[variant].image_id,
+                    *self.page_class.slot_geometry.center(
+                        self.page_class.level_state.slot_of(variant)
+                    ),
                 )
 
-            # If there already was an image in the slot
-            else:
-                to_delete = []
-                # Find the empty slots from bottom to top. The slots under the image have priority when filling compared to the slots above. If on the same side, the slot closest to the moved image has priority.
-                for slot_index, slot_image in reversed(
-                    list(enumerate(self.page_class.slotted_image_list))
-                ):
-                    # Check if is an empty slot
-                    if slot_image == 0:
-                        # If below, save the slot until a closer one is found
-                        if slot_index > put_in:
-                            to_delete = [slot_index]
-                        # If looking at slots above and an empty slot below has already been found, stop the loop
-                        elif len(to_delete) != 0:
-                            break
-                        # If no empty slots below, stop the loop on the first slot above
-                        else:
-                            to_delete = [slot_index]
-                            break
-
-                # Remove chosen empty slot value and insert the released image
-                del self.page_class.slotted_image_list[to_delete[0]], to_delete
-                self.page_class.slotted_image_list.insert(put_in, self.image_id)
-
-                # Re-position the images to their new slots
-                for image_object in self.page_class.image_objects_list:
-                    try:
-                        image_slot = self.page_class.slotted_image_list.index(
-                            image_object.image_id
-                        )
-                        self.canvas.coords(
-                            image_object.image_id,
-                            self.page_class.slot_centers_list[image_slot][0],
-                            self.page_class.slot_centers_list[image_slot][1],
-                        )
-                    except ValueError:
-                        continue
-
         # Play the image_grab audio if image wasn't locked into a slot
         else:
             self.app_object.play_image_grab()
 
+        self.page_class.refresh_visible()  # Images may have moved in or out of the visible part of the canvas
         self.app_object.button_check()
 
         # Make it possible to zoom in image again
@@ -1361,6 +2296,7 @@ class ImageClass:
         self.canvas.tag_bind(self.image_id, "<ButtonRelease-3>", self.full_image_close)
 
     # Runs when the user left-clicks on an image
+    @traced("mouse_click", lambda self, event: {"resolution": self.page_class.image_resolution, "source_size": self.pyramid.full_size})
     def mouse_click(self, event):
         # Disable zooming in when image is grabbed
         self.canvas.tag_unbind(self.image_id, "<Button-3>")
@@ -1368,37 +2304,186 @@ class ImageClass:
         self.app_object.play_image_grab()
 
         # If the image were in a slot, make it empty
-        try:
-            to_empty = self.page_class.slotted_image_list.index(self.image_id)
-            self.page_class.slotted_image_list[to_empty] = 0
-        except ValueError:
-            pass
+        self.page_class.level_state.remove(self.variant)
 
-        # Increase the size of the clicked image
-        self.selectedimage = self.image.resize(
-            (
-                int(self.page_class.image_resolution[0] * 1.1),
-                int(self.page_class.image_resolution[1] * 1.1),
-            )
+        # Increase the size of the clicked image. Until its pyramid is built, the image of the slot is stretched
+        lifted = (
+            int(self.page_class.image_resolution[0] * 1.1),
+            int(self.page_class.image_resolution[1] * 1.1),
         )
+        self.selectedimage = self.pyramid.resize_built(lifted)
+        if self.selectedimage is None:
+            self.selectedimage = self.page_class.images_list_resized[self.variant].resize(
+                lifted, Image.BILINEAR
+            )
+            self.page_class.request_pyramid(self.variant, lifted, lambda: self.show_lifted(lifted))
         self.selectedimage_photo = ImageTk.PhotoImage(self.selectedimage)
         self.canvas.itemconfig(self.image_id, image=self.selectedimage_photo)
+        self.enlarged = True
 
         self.canvas.tag_raise(self.image_id)  # Put image in front of every other one
         self.offset = (
-            self.canvas.coords(self.image_id)[0] - event.x,
-            self.canvas.coords(self.image_id)[1] - event.y,
+            self.canvas.coords(self.image_id)[0] - self.canvas.canvasx(event.x),
+            self.canvas.coords(self.image_id)[1] - self.canvas.canvasy(event.y),
         )  # Remember the position of the cursor relative to the image when it was clicked
 
-    # Runs when player drags image
+    # Replace the stretched image with the one from the pyramid, if the image is still grabbed
+    def show_lifted(self, lifted):
+        if not self.enlarged or self.selectedimage is None or self.selectedimage.size != lifted:
+            return
+        self.selectedimage = self.pyramid.resize_built(lifted)
+        self.selectedimage_photo = ImageTk.PhotoImage(self.selectedimage)
+        self.canvas.itemconfig(self.image_id, image=self.selectedimage_photo)
+
+    # Runs when player drags image. Only the latest position is saved, the image is moved at most once per frame
     def move_image(self, event):
+        self.drag_position = (event.x, event.y)
+        if self.drag_event_time is None:
+            self.drag_event_time = time.perf_counter()
+        if self.drag_job is None:
+            delay = self.last_drag_frame + self.app_object.frame_interval - time.perf_counter()
+            self.drag_job = self.canvas.after(max(int(delay * 1000), 0), self.apply_drag)
+
+    # Move the image to the latest cursor position
+    @traced("move_image", lambda self: {"resolution": self.page_class.image_resolution})
+    def apply_drag(self):
+        self.drag_job = None
+        if self.drag_position is None:
+            return
+        # Scroll the level while the image is held close to the top or bottom of the window
+        edge = self.app_object.autoscroll_margin
+        scroll = 0
+        if self.drag_position[1] < edge:
+            scroll = -1
+        elif self.drag_position[1] > self.canvas.winfo_height() - edge:
+            scroll = 1
+        if scroll:
+            self.page_class.scroll(scroll)
         self.canvas.coords(
-            self.image_id, self.offset[0] + event.x, self.offset[1] + event.y
-        )
-
-
-# Start the program
-app = Application()
-
-# Load the window
-app.root.mainloop()
+            self.image_id,
+            self.offset[0] + self.canvas.canvasx(self.drag_position[0]),
+            self.offset[1] + self.canvas.canvasy(self.drag_position[1]),
+        )
+        self.last_drag_frame = time.perf_counter()
+        if self.drag_event_time is not None:
+            self.app_object.drag_latency.add(self.last_drag_frame - self.drag_event_time)
+        self.drag_event_time = None
+        if scroll and self.page_class.content_height > self.canvas.winfo_height():
+            # Keep scrolling without new motion events while the cursor stays at the edge
+            self.drag_job = self.canvas.after(
+                int(self.app_object.frame_interval * 1000) * 3, self.apply_drag
+            )
+        else:
+            self.drag_position = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Image Vote")
+    parser.add_argument(
+        "--prewarm",
+        metavar="FOLDER",
+        help="resize the images of a renamed folder into the thumbnail cache and exit",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=2,
+        help="number of upcoming levels loaded in the background (default: 2)",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        default=2048,
+        metavar="MB",
+        help="memory used for images before other levels are released (default: 2048)",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="save the time of the hot paths to a Chrome trace JSON file (same as IMAGE_VOTE_TRACE)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="seed of the image spawn positions, to get the same layout on every run",
+    )
+    parser.add_argument(
+        "--results",
+        metavar="FILE",
+        help="file the ranking of every level is appended to (default: next to the poll folder or poll file, like renamed_files.results.jsonl)",
+    )
+    parser.add_argument(
+        "--voter",
+        help="name of the voter saved with the results (default: anonymous)",
+    )
+    parser.add_argument(
+        "--aggregate",
+        action="store_true",
+        help="print the total scores of every poll in the results file and exit",
+    )
+    parser.add_argument(
+        "--watch",
+        type=float,
+        metavar="SECONDS",
+        help="with --aggregate, keep updating the totals every SECONDS as new sessions arrive",
+    )
+    parser.add_argument(
+        "--adaptive",
+        type=float,
+        metavar="CONFIDENCE",
+        help="show the most uncertain levels first and finish once the order of the variants reaches this confidence, like 0.95",
+    )
+    parser.add_argument(
+        "--pairwise",
+        action="store_true",
+        help="rank the images of every level by choosing the better one of pairs",
+    )
+    parser.add_argument(
+        "--screen",
+        default="1920x1080",
+        help="screen size used by --prewarm, as WIDTHxHEIGHT (default: 1920x1080)",
+    )
+    args = parser.parse_args()
+    if args.trace:
+        tracer.enable(args.trace)
+
+    # Print the totals of the results file without opening the window
+    if args.aggregate:
+        if args.results is None:
+            parser.error("--aggregate needs the results file, given with --results")
+        totals = RunningTotals(args.results)
+        totals.update()
+        print(json.dumps(totals.scores(), indent=2))
+        while args.watch:
+            time.sleep(args.watch)
+            if totals.update():
+                print(json.dumps(totals.scores(), indent=2))
+    # Fill the thumbnail cache without opening the window
+    elif args.prewarm:
+        screen_size = tuple(int(value) for value in args.screen.lower().split("x"))
+        try:
+            resolution, failures = ThumbnailCache().prewarm(
+                args.prewarm,
+                screen_size,
+                progress=lambda done, total: print(f"\r{done}/{total}", end=""),
+            )
+        except (OSError, ValueError) as e:
+            sys.exit(f"Can't prewarm {args.prewarm}:\n{e}")
+        print(f"\nCached images at {resolution[0]}x{resolution[1]}")
+        for path, error in sorted(failures.items()):
+            print(f"Skipped {path}: {error}", file=sys.stderr)
+    else:
+        # Start the program
+        results_store = ResultsStore(args.results, args.voter)
+        app = Application(
+            args.prefetch,
+            args.memory_budget * 1024 * 1024,
+            args.seed,
+            results_store,
+            args.adaptive,
+            args.pairwise,
+        )
+
+        # Load the window
+        app.root.mainloop()
+        results_store.close()  # Sync the levels submitted before the window was closed
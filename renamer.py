@@ -0,0 +1,216 @@
+from concurrent.futures import ThreadPoolExecutor
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import os
+import shutil
+import sys
+import threading
+
+FICLONE = 0x40049409  # Linux ioctl that makes a copy-on-write clone of a file (Btrfs, XFS, bcachefs)
+
+# Errors that mean a way of placing files doesn't work between these folders, so it isn't tried again
+UNSUPPORTED_ERRORS = {
+    errno.EXDEV,
+    errno.EPERM,
+    errno.EACCES,
+    errno.EINVAL,
+    errno.ENOTTY,
+    errno.ENOSYS,
+    getattr(errno, "EOPNOTSUPP", errno.ENOTSUP),
+    errno.ENOTSUP,
+}
+
+
+# Copy-on-write clone of a file: it takes no extra space until one of the copies is modified
+def reflink(source, destination):
+    if sys.platform.startswith("linux"):
+        import fcntl
+
+        with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+            try:
+                fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+            except OSError:
+                destination_file.close()
+                os.remove(destination)
+                raise
+        # Keep the modification time, so the clone matches its source when the folder is synced again
+        stat = os.stat(source)
+        os.utime(destination, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    elif sys.platform == "darwin":
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if libc.clonefile(os.fsencode(source), os.fsencode(destination), 0) != 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+    else:
+        raise OSError(errno.ENOTSUP, "Reflinks are not supported on this system")
+
+
+def hardlink(source, destination):
+    os.link(source, destination)
+
+
+def symlink(source, destination):
+    os.symlink(os.path.abspath(source), destination)
+
+
+def copy(source, destination):
+    shutil.copy2(source, destination)
+
+
+# Ways of placing a file in the output folder, from the cheapest to the most expensive
+PLACE_METHODS = [("reflink", reflink), ("hardlink", hardlink), ("symlink", symlink), ("copy", copy)]
+
+
+# Hash of the contents of a file
+def file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Check if a file of the output folder already has the contents of its source: it is a link to it, or has the same size and modification time.
+# With use_hash, files with the same size but another modification time are compared by their contents
+def same_file(source, destination, use_hash=False):
+    try:
+        if os.path.islink(destination):
+            return os.readlink(destination) == os.path.abspath(source)
+        source_stat = os.stat(source)
+        destination_stat = os.stat(destination)
+    except OSError:
+        return False
+    if os.path.samestat(source_stat, destination_stat):
+        return True
+    if source_stat.st_size != destination_stat.st_size:
+        return False
+    if source_stat.st_mtime_ns == destination_stat.st_mtime_ns:
+        return True
+    return use_hash and file_hash(source) == file_hash(destination)
+
+
+# Difference between the planned renamed folder and what is already in it.
+# Comparing can read every file with use_hash, so it runs on the RenameJob worker and counts the files compared so far
+class SyncPlan:
+    def __init__(self, plan, output_path, use_hash=False):
+        self.plan = plan  # (source path, destination path) of every renamed file
+        self.output_path = output_path
+        self.use_hash = use_hash
+        self.changed = []  # Files that are new or have other contents
+        self.unchanged_count = 0
+        self.stale = []  # Files of the folder that aren't part of the plan anymore
+        self.compared_count = 0  # Files of the plan already compared
+
+    def compare(self):
+        planned = {os.path.normcase(destination) for _, destination in self.plan}
+        changed = []
+        for source, destination in self.plan:
+            if not same_file(source, destination, self.use_hash):
+                changed.append((source, destination))
+            self.compared_count += 1
+        self.changed = changed
+        self.unchanged_count = len(self.plan) - len(changed)
+        self.stale = [
+            entry.path
+            for entry in os.scandir(self.output_path)
+            if os.path.normcase(entry.path) not in planned
+        ]
+
+
+# Path a file is placed at before replacing the old one, so sources inside the output folder are still there while the other files are placed
+def temporary_path(destination):
+    return destination + ".renaming"
+
+
+# Compares the folder and places the files of a renamed folder on a thread pool, using the first way that works between the folders.
+# Reflinks, hardlinks and symlinks take no time or space, files are only copied if none of them work
+class RenameJob:
+    def __init__(self, sync_plan, workers=4):
+        self.sync_plan = sync_plan  # SyncPlan compared on the first worker
+        self.plan = []  # (source path, destination path) of every file to place, once compared
+        self.stale = []  # Files removed from the folder once the others are placed
+        self.planned = False  # The folder was compared and the files to place are known
+        self.plan_error = None  # Error found when comparing the folder
+        self.workers = workers
+        self.methods = {name: 0 for name, _ in PLACE_METHODS}  # Number of files placed with each method
+        self.unsupported = set()  # (source device, method name) that failed for a file, skipped for the next ones
+        self.failures = {}  # Source path and the error found when placing it
+        self.done_count = 0
+        self.lock = threading.Lock()
+        self.executor = None
+
+    # Start comparing the folder and placing the files in the background
+    def start(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.executor.submit(self.run_plan)
+
+    # Compare the folder, then place the changed files on the other workers
+    def run_plan(self):
+        try:
+            self.sync_plan.compare()
+            self.plan = self.sync_plan.changed
+            self.stale = self.sync_plan.stale
+            for source, destination in self.plan:
+                self.executor.submit(self.place, source, destination)
+        except Exception as e:
+            self.plan_error = e
+        finally:
+            self.planned = True
+            self.executor.shutdown(wait=False)
+
+    # Place one file with the cheapest method that works, next to the file it replaces
+    def place(self, source, destination):
+        try:
+            device = os.stat(source).st_dev
+            if os.path.lexists(temporary_path(destination)):
+                os.remove(temporary_path(destination))
+            for name, method in PLACE_METHODS:
+                if (device, name) in self.unsupported:
+                    continue
+                try:
+                    method(source, temporary_path(destination))
+                except OSError as e:
+                    if name == "copy":
+                        raise
+                    if e.errno in UNSUPPORTED_ERRORS:
+                        with self.lock:
+                            self.unsupported.add((device, name))
+                    continue
+                with self.lock:
+                    self.methods[name] += 1
+                break
+        except Exception as e:
+            with self.lock:
+                self.failures[source] = str(e) or type(e).__name__
+        with self.lock:
+            self.done_count += 1
+
+    # Check if all the files were placed
+    def finished(self):
+        return self.planned and self.done_count == len(self.plan)
+
+    # Replace the old files with the placed ones and remove the stale files. Runs once finished.
+    # The stale files are kept if a file couldn't be placed, so the folder isn't left with neither the old nor the new files
+    def commit(self):
+        if self.plan_error is not None:
+            raise self.plan_error
+        for source, destination in self.plan:
+            if source in self.failures:
+                if os.path.lexists(temporary_path(destination)):
+                    os.remove(temporary_path(destination))
+            else:
+                os.replace(temporary_path(destination), destination)
+        if self.failures:
+            return
+        for path in self.stale:
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+    # Number of files placed with each method, like "120 reflinked, 3 copied"
+    def summary(self):
+        words = {"reflink": "reflinked", "hardlink": "hardlinked", "symlink": "symlinked", "copy": "copied"}
+        return ", ".join(f"{count} {words[name]}" for name, count in self.methods.items() if count)
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+
+# Bytes used by each band of a pixel for the PIL modes that don't use 1 byte
+BAND_BYTES = {"I": 4, "F": 4, "I;16": 2, "I;16B": 2, "I;16L": 2, "I;16N": 2}
+
+
+# Approximate number of bytes used by the pixels of a PIL image
+def image_cost(image):
+    if image is None:
+        return 0
+    return image.width * image.height * len(image.getbands()) * BAND_BYTES.get(image.mode, 1)
+
+
+# Approximate number of bytes used by a Tk PhotoImage, which keeps 4 bytes per pixel
+def photo_cost(photo):
+    if photo is None:
+        return 0
+    return photo.width() * photo.height() * 4
+
+
+# Keeps the images of the levels under a memory budget. When the budget is exceeded, the images of the least recently shown levels outside of the active window are released.
+# A released level reloads its images when it is shown again
+class ResidencyManager:
+    def __init__(self, budget_bytes=2 * 1024 * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self.levels = OrderedDict()  # Level index and its object, from the least to the most recently shown
+
+    # Mark a level as shown now
+    def touch(self, level_index, level):
+        self.levels[level_index] = level
+        self.levels.move_to_end(level_index)
+
+    # Stop tracking a level
+    def forget(self, level_index):
+        self.levels.pop(level_index, None)
+
+    # Bytes used by the images of every tracked level
+    def total_cost(self):
+        return sum(level.memory_cost() for level in self.levels.values())
+
+    # Release levels until the total is under the budget. The levels in active_indices are kept, but their decoded originals can still be released as a last resort.
+    # reserved_bytes are used by images that aren't in a tracked level, like the levels prepared in advance, and count in the returned total
+    def enforce(self, active_indices=(), reserved_bytes=0):
+        total = self.total_cost() + reserved_bytes
+        for level_index, level in list(self.levels.items()):
+            if total <= self.budget_bytes:
+                return total
+            if level_index not in active_indices:
+                total -= level.release_images()
+        for level_index in active_indices:
+            if total <= self.budget_bytes:
+                break
+            if level_index in self.levels:
+                total -= self.levels[level_index].release_originals()
+        return total
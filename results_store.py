@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from scoring import kendall_w
+
+
+# Identifier of a poll that is the same on every machine: a hash of the variant names and the number of levels, not of the folder path
+def poll_id(variant_names, level_count):
+    key = "|".join(sorted(variant_names)) + f"|{level_count}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+# Results file used when none is given: next to the poll folder or poll file, like its manifest, so it doesn't depend on where the program was started
+def default_results_path(poll_path):
+    base = os.path.normpath(poll_path)
+    if base.endswith(".poll.json"):
+        base = base[: -len(".json")]
+    return base + ".results.jsonl"
+
+
+# Append-only log of the submitted levels, one JSON record per line.
+# Every record is written to the file right away, but the file is only synced to the disk every batch_size records or flush_interval seconds, and when closed
+class ResultsStore:
+    def __init__(self, path=None, voter=None, batch_size=16, flush_interval=2.0):
+        self.path = path  # None until a poll is opened when no file was given, then the default file of the poll
+        self.follow_poll = path is None  # Use the default file of every poll that is opened
+        self.voter = voter  # Name of the voter given with --voter, None if anonymous
+        self.session = uuid.uuid4().hex  # Identifier of this run of the program
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.file = None  # Opened on the first record
+        self.pending = 0  # Records written since the last sync
+        self.last_sync = time.monotonic()
+
+    # Switch to the default results file of a poll, unless a file was given
+    def open_poll(self, poll_path):
+        if not self.follow_poll:
+            return
+        path = default_results_path(poll_path)
+        if path != self.path:
+            self.close()
+            self.path = path
+
+    # Add the ranking of a level, with the variant names from the first to the last place
+    def append(self, poll, level, order, started, submitted):
+        record = {
+            "poll": poll,
+            "session": self.session,
+            "voter": self.voter,
+            "level": level,
+            "order": order,
+            "started": started,
+            "submitted": submitted,
+            "seconds": round(submitted - started, 3),
+        }
+        if self.file is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            self.file = open(self.path, "a", encoding="utf-8")
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.file.flush()
+        self.pending += 1
+        if (
+            self.pending >= self.batch_size
+            or time.monotonic() - self.last_sync >= self.flush_interval
+        ):
+            self.sync()
+
+    # Make sure the written records are on the disk
+    def sync(self):
+        if self.file is not None and self.pending:
+            os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    # Sync and close the file. The file is closed even if the sync fails
+    def close(self):
+        if self.file is not None:
+            try:
+                self.sync()
+            finally:
+                self.file.close()
+                self.file = None
+
+
+# Running totals of every poll in a results log, saved next to it with the position of the last record read.
+# Each update only reads the records appended since the previous one, so it doesn't get slower as the log grows
+class RunningTotals:
+    def __init__(self, path, snapshot_path=None):
+        self.path = path
+        self.snapshot_path = snapshot_path or path + ".totals.json"
+        self.offset = 0  # Bytes of the log already counted
+        self.polls = {}  # Poll identifier and its totals
+        self.log = None  # Identity of the counted log, see log_identity
+        self.load()
+
+    # Read the totals saved by a previous update, if they still match the log
+    def load(self):
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            return
+        if snapshot.get("offset", 0) <= self.log_size() and snapshot.get("log") == self.log_identity():
+            self.offset = snapshot["offset"]
+            self.polls = snapshot["polls"]
+            self.log = snapshot.get("log")
+
+    # A hash of the first record of the log, which changes when the log is replaced, even by one that grew past the counted offset
+    def log_identity(self):
+        try:
+            with open(self.path, "rb") as file:
+                first = file.readline()
+        except OSError:
+            return None
+        return hashlib.sha1(first).hexdigest() if first.endswith(b"\n") else None
+
+    def log_size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    # Count the records appended since the last update and save the totals. Returns the number of new records
+    def update(self):
+        # The log was replaced, count it again from the start
+        if self.offset and (self.log_size() < self.offset or self.log_identity() != self.log):
+            self.offset = 0
+            self.polls = {}
+        count = 0
+        try:
+            file = open(self.path, "rb")
+        except OSError:
+            return 0
+        with file:
+            file.seek(self.offset)
+            for line in file:
+                # A line without its end is still being written, it is read on the next update
+                if not line.endswith(b"\n"):
+                    break
+                self.offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self.add(record)
+                count += 1
+        if count:
+            self.log = self.log_identity()
+            self.save()
+        return count
+
+    # Add one level ranking to the totals of its poll
+    def add(self, record):
+        totals = self.polls.setdefault(
+            record["poll"], {"points": {}, "levels": 0, "sessions": {}, "seconds": 0}
+        )
+        order = record["order"]
+        level = str(record["level"])  # Keys are strings in the saved JSON
+        level_points = totals.setdefault("level_points", {}).setdefault(level, {})
+        for place, name in enumerate(order):
+            totals["points"][name] = totals["points"].get(name, 0) + len(order) - 1 - place
+            level_points[name] = level_points.get(name, 0) + len(order) - 1 - place
+        level_ballots = totals.setdefault("level_ballots", {})
+        level_ballots[level] = level_ballots.get(level, 0) + 1
+        totals["levels"] += 1
+        totals["seconds"] += record.get("seconds", 0)
+        totals["sessions"][record["session"]] = totals["sessions"].get(record["session"], 0) + 1
+
+    def save(self):
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"offset": self.offset, "log": self.log, "polls": self.polls}, file)
+        os.replace(temp_path, self.snapshot_path)
+
+    # Number of rankings of each level of a poll, Kendall's W between them (None with less than two rankings) and the points of each variant name
+    def level_stats(self, poll):
+        totals = self.polls.get(poll, {})
+        return {
+            int(level): (
+                ballots,
+                kendall_w(
+                    totals["level_points"][level],
+                    ballots,
+                    len(totals["level_points"][level]),
+                ),
+                totals["level_points"][level],
+            )
+            for level, ballots in totals.get("level_ballots", {}).items()
+        }
+
+    # Variant names and their points of every poll, from the highest to the lowest score
+    def scores(self):
+        return {
+            poll: {
+                "levels": totals["levels"],
+                "sessions": len(totals["sessions"]),
+                "mean_level_seconds": totals["seconds"] / max(totals["levels"], 1),
+                "points": dict(
+                    sorted(totals["points"].items(), key=lambda item: -item[1])
+                ),
+            }
+            for poll, totals in self.polls.items()
+        }
@@ -0,0 +1,243 @@
+from statistics import NormalDist
+import math
+import numpy as np
+
+
+# Place of every variant in every submitted level (0 is the first place), one row per level.
+# The rows are kept in one array that doubles its size when full, like a list
+class RankMatrix:
+    def __init__(self, variant_count, capacity=16):
+        self.variant_count = variant_count
+        self.dtype = np.min_scalar_type(max(variant_count - 1, 0))  # Smallest integer type that fits every place
+        self.array = np.empty((max(capacity, 1), variant_count), dtype=self.dtype)
+        self.count = 0  # Number of rows used
+
+    # Add the ranking of a level, with the variants from the first to the last place
+    def append(self, ranking):
+        if self.count == len(self.array):
+            self.array = np.concatenate([self.array, np.empty_like(self.array)])
+        self.array[self.count, ranking] = np.arange(self.variant_count)
+        self.count += 1
+
+    # Add many rows of places at once
+    def extend(self, places):
+        places = np.asarray(places, dtype=self.dtype)
+        while self.count + len(places) > len(self.array):
+            self.array = np.concatenate([self.array, np.empty_like(self.array)])
+        self.array[self.count : self.count + len(places)] = places
+        self.count += len(places)
+
+    # Used rows of the matrix, without copying them
+    def places(self):
+        return self.array[: self.count]
+
+    # Rankings of the levels, with the variants from the first to the last place
+    def rankings(self):
+        return np.argsort(self.places(), axis=1).tolist()
+
+    def __len__(self):
+        return self.count
+
+
+# Points of each variant with the Borda count: in a level with n variants, the first place gets n - 1 points and the last one gets 0
+def borda_points(places):
+    variant_count = places.shape[1]
+    return (variant_count - 1) * len(places) - places.sum(axis=0, dtype=np.int64)
+
+
+# Average place of each variant, starting from 1
+def mean_rank(places):
+    return places.mean(axis=0) + 1
+
+
+# Median place of each variant, starting from 1
+def median_rank(places):
+    return np.median(places, axis=0) + 1
+
+
+# Number of levels where each variant (row) was placed above each other variant (column).
+# The levels are processed in chunks so the memory doesn't grow with the number of levels
+def pairwise_wins(places, chunk_cells=4_000_000):
+    variant_count = places.shape[1]
+    wins = np.zeros((variant_count, variant_count), dtype=np.int64)
+    chunk = max(chunk_cells // max(variant_count * variant_count, 1), 1)
+    for start in range(0, len(places), chunk):
+        block = places[start : start + chunk]
+        wins += (block[:, :, None] < block[:, None, :]).sum(axis=0)
+    return wins
+
+
+# Approximation of the Kemeny ranking, the order that agrees with the most pairwise preferences of the levels.
+# Starts from the Borda order and swaps neighbours while a swap agrees with more levels, which stops after at most n passes
+def kemeny_order(places, wins=None):
+    if wins is None:
+        wins = pairwise_wins(places)
+    variant_count = places.shape[1]
+    order = list(np.lexsort((np.arange(variant_count), -borda_points(places))))
+    for _ in range(variant_count):
+        swapped = False
+        for index in range(variant_count - 1):
+            above, below = order[index], order[index + 1]
+            if wins[below, above] > wins[above, below]:
+                order[index], order[index + 1] = below, above
+                swapped = True
+        if not swapped:
+            break
+    return [int(variant) for variant in order]
+
+
+# Confidence interval of the Borda points of each variant, by resampling the levels with replacement.
+# Every resample is a count of how many times each level was drawn, so the points of all resamples are one matrix product.
+# With more than max_cells drawn levels, the points of the resamples are a sum of so many levels that they follow a normal distribution, which is used instead
+def bootstrap_intervals(
+    places, samples=1000, confidence=0.95, seed=None, chunk_cells=4_000_000, max_cells=20_000_000
+):
+    rng = np.random.default_rng(seed)
+    level_count, variant_count = places.shape
+    if level_count == 0:
+        empty = np.zeros(variant_count)
+        return empty, empty
+    level_points = variant_count - 1 - places.astype(np.int64)
+    if level_count * samples > max_cells:
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        spread = z * level_points.std(axis=0) * math.sqrt(level_count)
+        totals = level_points.sum(axis=0)
+        return totals - spread, totals + spread
+    chunk = max(chunk_cells // level_count, 1)
+    totals = []
+    for start in range(0, samples, chunk):
+        counts = rng.multinomial(
+            level_count, np.full(level_count, 1 / level_count), size=min(chunk, samples - start)
+        )
+        totals.append(counts @ level_points)
+    totals = np.concatenate(totals)
+    tail = (1 - confidence) / 2 * 100
+    return np.percentile(totals, tail, axis=0), np.percentile(totals, 100 - tail, axis=0)
+
+
+# Kendall's coefficient of concordance of m rankings of n variants, from 0 (no agreement) to 1 (every ranking is the same).
+# Takes the Borda points of each variant: the rank sum of a variant is m * n minus its points, since the place p (from 1) of a variant gives it n - p points
+def kendall_w(points, rankings, variant_count):
+    if rankings < 2 or variant_count < 2:
+        return None
+    mean_rank_sum = rankings * (variant_count + 1) / 2
+    spread = sum(
+        (rankings * variant_count - variant_points - mean_rank_sum) ** 2
+        for variant_points in points.values()
+    )
+    return 12 * spread / (rankings**2 * (variant_count**3 - variant_count))
+
+
+# Plackett-Luce model of the rankings: every variant has a strength, and each place is taken by one of the remaining variants with a chance proportional to its strength.
+# The strengths are fitted with the MM algorithm of Hunter (2004), starting from the previous fit after every new ranking.
+# A prior of one virtual win and one virtual loss against a variant of strength 1 keeps them finite with few rankings
+class PlackettLuce:
+    def __init__(self, variant_count, prior=1.0, iterations=20):
+        self.variant_count = variant_count
+        self.prior = prior  # Weight of the virtual win and loss of every variant
+        self.iterations = iterations  # MM iterations after each new ranking
+        self.rankings = RankMatrix(variant_count)
+        self.strengths = np.ones(variant_count)
+
+    # Add a ranking, with the variants from the first to the last place, and update the strengths
+    def add(self, ranking):
+        self.rankings.append(ranking)
+        self.fit()
+
+    def __len__(self):
+        return len(self.rankings)
+
+    # Variants of each ranking from the first to the last place
+    def orders(self):
+        return np.argsort(self.rankings.places(), axis=1)
+
+    # Sum of the strengths of the variants still remaining at each place of each ranking
+    def remaining_strengths(self, orders):
+        ordered = self.strengths[orders]
+        return np.cumsum(ordered[:, ::-1], axis=1)[:, ::-1][:, :-1]
+
+    def fit(self):
+        orders = self.orders()
+        count, variant_count = orders.shape
+        if variant_count < 2:
+            return
+        # Number of places won by each variant, every variant but the last one wins a place
+        wins = np.bincount(orders[:, :-1].ravel(), minlength=variant_count) + self.prior
+        positions = np.minimum(np.arange(variant_count), variant_count - 2)
+        for _ in range(self.iterations):
+            inverse = np.cumsum(1 / self.remaining_strengths(orders), axis=1)
+            denominators = np.bincount(
+                orders.ravel(),
+                weights=inverse[:, positions].ravel(),
+                minlength=variant_count,
+            )
+            self.strengths = wins / (denominators + 2 * self.prior / (self.strengths + 1))
+
+    # Variance of the log strength of each variant, from the Fisher information of the rankings
+    def variances(self):
+        orders = self.orders()
+        count, variant_count = orders.shape
+        information = np.full(variant_count, self.prior / 4)
+        if count and variant_count > 1:
+            ordered = self.strengths[orders]
+            chances = ordered[:, None, :] / self.remaining_strengths(orders)[:, :, None]
+            # A variant only takes part in the places up to its own
+            taking_part = np.arange(variant_count)[None, :] >= np.arange(variant_count - 1)[:, None]
+            place_information = (chances * (1 - chances) * taking_part).sum(axis=1)
+            information += np.bincount(
+                orders.ravel(), weights=place_information.ravel(), minlength=variant_count
+            )
+        return 1 / information
+
+    # Variants from the strongest to the weakest
+    def order(self):
+        return [int(variant) for variant in np.argsort(-self.strengths, kind="stable")]
+
+    # Pair of neighbouring variants in the order that the model is the least sure about, as (above, below, chance that above is stronger)
+    def least_confident_pair(self):
+        order = self.order()
+        log_strengths = np.log(self.strengths)
+        variances = self.variances()
+        normal = NormalDist()
+        return min(
+            (
+                (
+                    above,
+                    below,
+                    normal.cdf(
+                        (log_strengths[above] - log_strengths[below])
+                        / math.sqrt(variances[above] + variances[below])
+                    ),
+                )
+                for above, below in zip(order, order[1:])
+            ),
+            key=lambda pair: pair[2],
+        )
+
+    # Chance that every variant is stronger than the next one in the order, the lowest of the neighbouring pairs
+    def confidence(self):
+        if self.variant_count < 2:
+            return 1.0
+        return self.least_confident_pair()[2]
+
+
+# Every score of each variant, from the highest to the lowest Borda points
+def score_summary(places, names, samples=1000, confidence=0.95, seed=None):
+    points = borda_points(places)
+    means = mean_rank(places)
+    medians = median_rank(places)
+    kemeny_places = np.empty(len(names), dtype=np.int64)
+    kemeny_places[kemeny_order(places)] = np.arange(1, len(names) + 1)
+    low, high = bootstrap_intervals(places, samples, confidence, seed)
+    order = np.lexsort((np.arange(len(names)), -points))
+    return [
+        {
+            "name": names[variant],
+            "points": int(points[variant]),
+            "mean_rank": float(means[variant]),
+            "median_rank": float(medians[variant]),
+            "kemeny_place": int(kemeny_places[variant]),
+            "interval": (float(low[variant]), float(high[variant])),
+        }
+        for variant in order
+    ]
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules are at the root of the repository, like benchmarks/bench.py imports them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,47 @@
+import json
+from aggregate import aggregate, aggregate_files
+
+
+def write_session(path, session, orders):
+    with open(path, "w", encoding="utf-8") as file:
+        for level, order in enumerate(orders):
+            record = {
+                "poll": "poll",
+                "session": session,
+                "voter": None,
+                "level": level,
+                "order": order,
+                "seconds": 1.0,
+            }
+            file.write(json.dumps(record) + "\n")
+
+
+def test_aggregate_merges_the_sessions_of_every_file(tmp_path):
+    folder = tmp_path / "sessions"
+    folder.mkdir()
+    write_session(folder / "a.jsonl", "a", [["A", "B", "C"], ["A", "B", "C"]])
+    write_session(folder / "b.jsonl", "b", [["A", "C", "B"], ["B", "A", "C"]])
+    (folder / "notes.txt").write_text("not a session")
+    polls, errors = aggregate([str(folder)], workers=2, shard_size=1)
+    assert errors == 0
+    report = polls["poll"]
+    assert report["ballots"] == 4
+    assert report["sessions"] == 2
+    assert report["points"] == {"A": 7, "B": 4, "C": 1}
+    assert report["levels"][0]["ballots"] == 2
+
+
+def test_aggregate_counts_more_shards_than_the_queue_holds(tmp_path):
+    for index in range(7):
+        write_session(tmp_path / f"{index}.jsonl", str(index), [["A", "B"]])
+    polls, errors = aggregate([str(tmp_path)], workers=1, shard_size=1)
+    assert errors == 0
+    assert polls["poll"]["ballots"] == 7
+    assert polls["poll"]["points"] == {"A": 7, "B": 0}
+
+
+def test_unreadable_files_and_records_are_counted(tmp_path):
+    path = tmp_path / "broken.jsonl"
+    path.write_text('{"poll": "poll"}\nnot json\n')
+    _, errors = aggregate_files([str(path), str(tmp_path / "missing.jsonl")])
+    assert errors == 3
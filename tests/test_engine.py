@@ -0,0 +1,221 @@
+import json
+import math
+import os
+import pytest
+import random
+from engine import (
+    LevelScheduler,
+    LevelState,
+    MergeInsertion,
+    PollEngine,
+    PollFolder,
+    SlotGeometry,
+    SpawnLayout,
+    merge_insertion_comparisons,
+    natural_key,
+    slot_resolution,
+)
+
+
+# Check that the slots and the slot of every variant agree
+def check_consistent(state):
+    for slot, variant in enumerate(state.slots):
+        if variant is not None:
+            assert state.slot_of(variant) == slot
+    assert len(state.variant_slots) == sum(variant is not None for variant in state.slots)
+
+
+def test_place_in_empty_slot():
+    state = LevelState(3)
+    assert state.place(0, 1) == [0]
+    assert state.slots == [None, 0, None]
+    assert not state.complete()
+
+
+def test_place_shifts_towards_the_empty_slot_below():
+    state = LevelState(4)
+    state.place(0, 0)
+    state.place(1, 1)
+    moved = state.place(2, 0)
+    assert state.slots == [2, 0, 1, None]
+    assert sorted(moved) == [0, 1, 2]
+    check_consistent(state)
+
+
+def test_place_shifts_up_without_empty_slots_below():
+    state = LevelState(3)
+    state.place(0, 1)
+    state.place(1, 2)
+    state.place(2, 2)
+    assert state.slots == [0, 1, 2]
+    assert state.complete()
+    assert state.ranking() == [0, 1, 2]
+    check_consistent(state)
+
+
+def test_moving_a_variant_frees_its_slot():
+    state = LevelState(3)
+    state.place(0, 0)
+    state.place(0, 2)
+    assert state.slots == [None, None, 0]
+    state.remove(0)
+    assert state.slot_of(0) is None
+
+
+def test_random_placements_stay_consistent():
+    rng = random.Random(0)
+    for _ in range(200):
+        count = rng.randint(1, 12)
+        state = LevelState(count)
+        for _ in range(50):
+            state.place(rng.randrange(count), rng.randrange(count))
+            check_consistent(state)
+        for variant in range(count):
+            state.place(variant, rng.randrange(count))
+        assert sorted(state.ranking()) == list(range(count))
+
+
+def test_slot_geometry_snaps_to_the_closest_slot():
+    geometry = SlotGeometry(4, 100, 50)
+    assert geometry.center(1) == (100, 75)
+    assert geometry.slot_at(-10) == 0
+    assert geometry.slot_at(120) == 2
+    assert geometry.slot_at(1000) == 3
+    assert geometry.snap(110, 80) == 1
+    assert geometry.snap(300, 80) is None
+
+
+def test_spawn_layout_is_seeded_and_stays_in_its_regions():
+    regions = [(0, 0, 100, 400), (300, 0, 400, 400)]
+    points = SpawnLayout(regions, 50, seed=3).spawn(10)
+    assert points == SpawnLayout(regions, 50, seed=3).spawn(10)
+    for x, y in points:
+        assert any(
+            left <= x <= right and top <= y <= bottom for left, top, right, bottom in regions
+        )
+
+
+def test_spawn_layout_keeps_the_points_apart_when_there_is_room():
+    points = SpawnLayout([(0, 0, 1000, 1000)], 50, seed=1).spawn(20)
+    assert min(math.dist(a, b) for i, a in enumerate(points) for b in points[i + 1 :]) >= 50
+
+
+def test_spawn_layout_overlaps_instead_of_never_ending():
+    assert len(SpawnLayout([(0, 0, 10, 10)], 50, seed=1).spawn(30)) == 30
+
+
+def test_slot_resolution_keeps_the_aspect_ratio_and_the_minimum_height():
+    assert slot_resolution(1920, 1080, 3, (6000, 4000)) == (540, 360)
+    # Too many variants to fit, the slots keep the minimum height
+    assert slot_resolution(1920, 1080, 64, (6000, 4000)) == (150, 100)
+    # Never bigger than the original
+    assert slot_resolution(1920, 1080, 1, (300, 200)) == (300, 200)
+
+
+def test_natural_key():
+    names = ["A10", "A2", "b1", "A1"]
+    assert sorted(names, key=natural_key) == ["A1", "A2", "A10", "b1"]
+
+
+def test_index_sorts_levels_and_variants_naturally(tmp_path):
+    filenames = ["B10.jpg", "B2.jpg", "A2.jpg", "A10.jpg", "A1.jpg", "B1.jpg", ".DS_Store"]
+    folder = PollFolder(str(tmp_path), filenames)
+    assert folder.valid()
+    assert folder.variant_names == ["A", "B"]
+    assert folder.level_numbers == [1, 2, 10]
+    assert folder.levels == [["A1.jpg", "B1.jpg"], ["A2.jpg", "B2.jpg"], ["A10.jpg", "B10.jpg"]]
+    assert folder.filenames == ["A1.jpg", "B1.jpg", "A2.jpg", "B2.jpg", "A10.jpg", "B10.jpg"]
+
+
+def test_index_finds_problems(tmp_path):
+    folder = PollFolder(str(tmp_path), ["A1.jpg", "A2.jpg", "B1.jpg", "B01.png", "notes.txt"])
+    assert not folder.valid()
+    assert folder.gaps == {"B": [2]}
+    assert folder.duplicates == ["B1.jpg", "B01.png"]
+    assert folder.unparsed == ["notes.txt"]
+    assert folder.variant_count == 0
+
+
+def test_manifest_is_reused_until_the_folder_changes(tmp_path):
+    folder_path = tmp_path / "renamed_files"
+    folder_path.mkdir()
+    for name in ["A1.jpg", "B1.jpg"]:
+        (folder_path / name).write_bytes(b"")
+    folder = PollFolder(str(folder_path))
+    assert os.path.isfile(folder.manifest_path)
+
+    # A folder with the same modification time is read from the manifest, not listed again
+    with open(folder.manifest_path, encoding="utf-8") as file:
+        manifest = json.load(file)
+    manifest["variant_names"] = ["Cached"]
+    with open(folder.manifest_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file)
+    assert PollFolder(str(folder_path)).variant_names == ["Cached"]
+
+    (folder_path / "C1.jpg").write_bytes(b"")
+    stat = os.stat(folder_path)
+    os.utime(folder_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert PollFolder(str(folder_path)).variant_names == ["A", "B", "C"]
+
+
+def test_poll_definition(tmp_path):
+    definition = tmp_path / "poll.poll.json"
+    definition.write_text(
+        json.dumps({"version": 1, "variants": ["A", "B"], "levels": [["a.jpg", "b.jpg"]]})
+    )
+    folder = PollFolder(str(definition))
+    assert folder.valid()
+    assert folder.filenames == [str(tmp_path / "a.jpg"), str(tmp_path / "b.jpg")]
+
+
+def test_engine_scores_the_submitted_levels_with_borda(tmp_path):
+    folder = PollFolder(str(tmp_path), ["A1.jpg", "A2.jpg", "B1.jpg", "B2.jpg", "C1.jpg", "C2.jpg"])
+    engine = PollEngine(folder)
+    for level, ranking in enumerate([[0, 1, 2], [1, 0, 2]]):
+        for slot, variant in enumerate(ranking):
+            engine.levels[level].place(variant, slot)
+        engine.submit_level(level)
+    assert engine.scores() == {0: 3, 1: 3, 2: 0}
+    assert list(engine.final_scores().items()) == [("A", 3), ("B", 3), ("C", 0)]
+
+
+def test_engine_refuses_levels_with_empty_slots(tmp_path):
+    engine = PollEngine(PollFolder(str(tmp_path), ["A1.jpg", "B1.jpg"]))
+    engine.levels[0].place(0, 0)
+    with pytest.raises(ValueError):
+        engine.submit_level(0)
+
+
+def test_scheduler_shows_uncertain_levels_first_and_picks_again_after_each_ranking():
+    names = ["A", "B", "C"]
+    level_stats = {
+        0: (4, 0.9, {"A": 8, "B": 4, "C": 0}),
+        1: (4, 0.5, {"A": 4, "B": 4, "C": 4}),
+        2: (4, 0.6, {"A": 0, "B": 8, "C": 4}),
+    }
+    scheduler = LevelScheduler(4, 3, level_stats=level_stats, seed=1, variant_names=names)
+    # The level without rankings first, then the least agreed on
+    assert scheduler.order == [3, 1, 2, 0]
+    # A is clearly ahead, so B and C are the least sure pair. Level 2 separated them the best
+    scheduler.add([0, 1, 2])
+    scheduler.add([0, 2, 1])
+    assert scheduler.model.least_confident_pair()[:2] in ((1, 2), (2, 1))
+    assert scheduler.next_levels([3]) == [2, 1, 0]
+
+
+def test_merge_insertion_sorts_within_the_comparison_bound():
+    rng = random.Random(0)
+    for count in range(1, 40):
+        for _ in range(5):
+            strengths = list(range(count))
+            rng.shuffle(strengths)
+            comparison = MergeInsertion(range(count))
+            while not comparison.finished():
+                first, second = comparison.pair
+                comparison.answer(strengths[first] > strengths[second])
+            assert comparison.order == sorted(range(count), key=lambda item: -strengths[item])
+            assert comparison.comparisons <= merge_insertion_comparisons(count)
+
+
+def test_merge_insertion_comparison_bound():
+    assert [merge_insertion_comparisons(count) for count in (1, 2, 3, 4, 5, 20)] == [0, 1, 3, 5, 7, 62]
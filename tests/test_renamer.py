@@ -0,0 +1,80 @@
+import os
+import shutil
+import time
+from renamer import RenameJob, SyncPlan
+
+
+def make_files(folder, contents):
+    folder.mkdir(exist_ok=True)
+    for name, data in contents.items():
+        (folder / name).write_bytes(data)
+
+
+def run_job(job):
+    job.start()
+    while not job.finished():
+        time.sleep(0.01)
+    job.commit()
+
+
+def test_sync_plan_keeps_unchanged_files_and_finds_stale_ones(tmp_path):
+    source = tmp_path / "source"
+    output = tmp_path / "renamed_files"
+    make_files(source, {"a.jpg": b"aaaa", "b.jpg": b"bbbb", "c.jpg": b"cccc"})
+    make_files(output, {"old1.jpg": b"x"})
+    shutil.copy2(source / "a.jpg", output / "A1.jpg")
+    # Same size and contents, but another modification time
+    (output / "B1.jpg").write_bytes(b"bbbb")
+    os.utime(output / "B1.jpg", (0, 0))
+    plan = [
+        (str(source / "a.jpg"), str(output / "A1.jpg")),
+        (str(source / "b.jpg"), str(output / "B1.jpg")),
+        (str(source / "c.jpg"), str(output / "C1.jpg")),
+    ]
+
+    sync_plan = SyncPlan(plan, str(output))
+    sync_plan.compare()
+    assert sync_plan.compared_count == 3
+    assert [destination for _, destination in sync_plan.changed] == [
+        str(output / "B1.jpg"),
+        str(output / "C1.jpg"),
+    ]
+    assert sync_plan.unchanged_count == 1
+    assert sync_plan.stale == [str(output / "old1.jpg")]
+
+    # Comparing the contents finds that B1 didn't change
+    sync_plan = SyncPlan(plan, str(output), use_hash=True)
+    sync_plan.compare()
+    assert sync_plan.unchanged_count == 2
+
+
+def test_rename_job_places_the_files_and_removes_stale_ones(tmp_path):
+    source = tmp_path / "source"
+    output = tmp_path / "renamed_files"
+    make_files(source, {"a.jpg": b"aaaa", "b.jpg": b"bbbb"})
+    make_files(output, {"old1.jpg": b"x"})
+    plan = [
+        (str(source / "a.jpg"), str(output / "A1.jpg")),
+        (str(source / "b.jpg"), str(output / "B1.jpg")),
+    ]
+    job = RenameJob(SyncPlan(plan, str(output)))
+    run_job(job)
+    assert not job.failures
+    assert sorted(os.listdir(output)) == ["A1.jpg", "B1.jpg"]
+    assert (output / "B1.jpg").read_bytes() == b"bbbb"
+    assert sum(job.methods.values()) == 2
+
+
+def test_rename_job_keeps_stale_files_when_a_file_fails(tmp_path):
+    source = tmp_path / "source"
+    output = tmp_path / "renamed_files"
+    make_files(source, {"a.jpg": b"aaaa"})
+    make_files(output, {"old1.jpg": b"x"})
+    plan = [
+        (str(source / "a.jpg"), str(output / "A1.jpg")),
+        (str(source / "missing.jpg"), str(output / "B1.jpg")),
+    ]
+    job = RenameJob(SyncPlan(plan, str(output)))
+    run_job(job)
+    assert list(job.failures) == [str(source / "missing.jpg")]
+    assert sorted(os.listdir(output)) == ["A1.jpg", "old1.jpg"]
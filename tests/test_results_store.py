@@ -0,0 +1,90 @@
+import os
+import pytest
+from results_store import ResultsStore, RunningTotals, default_results_path
+
+
+def append_levels(path, orders, session_store=None):
+    store = session_store or ResultsStore(path)
+    for level, order in enumerate(orders):
+        store.append("poll", level, order, 0.0, 1.0)
+    store.close()
+
+
+def test_totals_count_borda_points(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    append_levels(path, [["A", "B", "C"], ["B", "A", "C"]])
+    totals = RunningTotals(path)
+    assert totals.update() == 2
+    scores = totals.scores()["poll"]
+    assert scores["points"] == {"A": 3, "B": 3, "C": 0}
+    assert scores["levels"] == 2
+    assert scores["sessions"] == 1
+    assert totals.level_stats("poll")[0][0] == 1
+
+
+def test_totals_only_read_new_records(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    append_levels(path, [["A", "B"]])
+    RunningTotals(path).update()
+
+    # A new instance starts from the saved snapshot
+    totals = RunningTotals(path)
+    assert totals.update() == 0
+    append_levels(path, [["B", "A"]])
+    assert totals.update() == 1
+    assert totals.scores()["poll"]["points"] == {"A": 1, "B": 1}
+
+
+def test_totals_skip_a_line_being_written(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    append_levels(path, [["A", "B"]])
+    with open(path, "a", encoding="utf-8") as file:
+        file.write('{"poll": "poll"')
+    totals = RunningTotals(path)
+    assert totals.update() == 1
+    assert totals.offset < len(open(path, "rb").read())
+
+
+def test_totals_restart_when_the_log_is_replaced(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    append_levels(path, [["A", "B"], ["A", "B"]])
+    totals = RunningTotals(path)
+    totals.update()
+    open(path, "w").close()
+    append_levels(path, [["B", "A"]])
+    totals.update()
+    assert totals.scores()["poll"]["points"] == {"A": 0, "B": 1}
+
+
+def test_totals_restart_when_the_log_is_replaced_by_a_longer_one(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    append_levels(path, [["A", "B"]])
+    RunningTotals(path).update()
+    os.remove(path)
+    append_levels(path, [["B", "A"], ["B", "A"], ["B", "A"]])
+    totals = RunningTotals(path)
+    totals.update()
+    assert totals.scores()["poll"]["points"] == {"A": 0, "B": 3}
+
+
+def test_append_raises_when_the_file_cant_be_written(tmp_path):
+    # The folder of the results file is a file, like a folder that can't be written
+    (tmp_path / "blocked").write_text("")
+    store = ResultsStore(str(tmp_path / "blocked" / "results.jsonl"))
+    with pytest.raises(OSError):
+        store.append("poll", 0, ["A", "B"], 0.0, 1.0)
+    store.close()
+
+
+def test_default_results_file_is_next_to_the_poll(tmp_path):
+    folder = str(tmp_path / "renamed_files")
+    assert default_results_path(folder + os.sep) == folder + ".results.jsonl"
+    definition = str(tmp_path / "vote.poll.json")
+    assert default_results_path(definition) == str(tmp_path / "vote.poll.results.jsonl")
+    store = ResultsStore()
+    store.open_poll(folder)
+    assert store.path == folder + ".results.jsonl"
+    # A file given with --results is kept
+    store = ResultsStore(str(tmp_path / "given.jsonl"))
+    store.open_poll(folder)
+    assert store.path == str(tmp_path / "given.jsonl")
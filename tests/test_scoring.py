@@ -0,0 +1,61 @@
+import pytest
+from scoring import (
+    PlackettLuce,
+    RankMatrix,
+    bootstrap_intervals,
+    borda_points,
+    kemeny_order,
+    kendall_w,
+    mean_rank,
+    median_rank,
+)
+
+
+def rank_matrix(rankings, variant_count):
+    matrix = RankMatrix(variant_count, capacity=1)
+    for ranking in rankings:
+        matrix.append(ranking)
+    return matrix
+
+
+def test_rank_matrix_grows_and_keeps_the_places():
+    matrix = rank_matrix([[2, 0, 1], [0, 1, 2], [1, 2, 0]], 3)
+    assert len(matrix) == 3
+    assert matrix.places().tolist() == [[1, 2, 0], [0, 1, 2], [2, 0, 1]]
+    assert matrix.rankings() == [[2, 0, 1], [0, 1, 2], [1, 2, 0]]
+
+
+def test_borda_points_and_ranks():
+    places = rank_matrix([[0, 1, 2], [0, 2, 1], [1, 0, 2]], 3).places()
+    assert borda_points(places).tolist() == [5, 3, 1]
+    assert mean_rank(places).tolist() == pytest.approx([4 / 3, 2, 8 / 3])
+    assert median_rank(places).tolist() == [1, 2, 3]
+
+
+def test_kemeny_order_follows_the_majority_of_every_pair():
+    places = rank_matrix([[0, 1, 2], [0, 2, 1], [1, 0, 2]], 3).places()
+    assert kemeny_order(places) == [0, 1, 2]
+
+
+def test_bootstrap_interval_contains_the_points():
+    places = rank_matrix([[0, 1, 2]] * 5 + [[1, 0, 2]] * 5, 3).places()
+    low, high = bootstrap_intervals(places, samples=200, seed=1)
+    points = borda_points(places)
+    assert (low <= points).all() and (points <= high).all()
+    # Always last, so the interval has no spread
+    assert low[2] == high[2] == 0
+
+
+def test_kendall_w():
+    assert kendall_w({"A": 4, "B": 2, "C": 0}, 2, 3) == 1
+    assert kendall_w({"A": 2, "B": 2, "C": 2}, 2, 3) == 0
+    assert kendall_w({"A": 2, "B": 1, "C": 0}, 1, 3) is None
+
+
+def test_plackett_luce_learns_the_order_and_gets_confident():
+    model = PlackettLuce(3)
+    for _ in range(20):
+        model.add([2, 0, 1])
+    assert len(model) == 20
+    assert model.order() == [2, 0, 1]
+    assert model.confidence() > 0.95
@@ -0,0 +1,76 @@
+from PIL import Image, ImageChops
+import random
+from tiles import TileCache, TiledImage, raw_tiles, render_tile
+
+
+def noise_image(size):
+    rng = random.Random(0)
+    return Image.frombytes("RGB", size, bytes(rng.randrange(256) for _ in range(size[0] * size[1] * 3)))
+
+
+def test_cache_drops_the_least_recently_used_tiles():
+    tile = Image.new("RGB", (10, 10))
+    cache = TileCache(budget_bytes=3 * 10 * 10 * 3)
+    for key in "abc":
+        cache.put(key, tile)
+    cache.get("a")
+    cache.put("d", tile)
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache and "d" in cache
+    assert cache.total_bytes == 3 * 10 * 10 * 3
+
+
+def test_tiles_are_cut_from_the_level(tmp_path):
+    path = str(tmp_path / "image.png")
+    noise_image((300, 170)).save(path)
+    tiled = TiledImage(path, TileCache(), tile_size=64)
+    assert tiled.level_count == 4
+    for level in range(tiled.level_count):
+        whole = tiled.decode(level)
+        assert whole.size == tiled.level_size(level)
+        columns, rows = tiled.grid(level)
+        for column in range(columns):
+            for row in range(rows):
+                tile = tiled.tile(level, column, row)
+                expected = whole.crop(tiled.tile_box(level, column, row))
+                assert ImageChops.difference(tile, expected).getbbox() is None
+
+
+def test_files_without_compression_are_read_by_region(tmp_path):
+    image = noise_image((300, 170))
+    for extension in ("tif", "bmp", "ppm"):
+        path = str(tmp_path / f"image.{extension}")
+        image.save(path)
+        with Image.open(path) as opened:
+            assert raw_tiles(opened) is not None
+        tiled = TiledImage(path, TileCache(), tile_size=64)
+        for level in range(tiled.level_count):
+            whole = tiled.decode(level)
+            columns, rows = tiled.grid(level)
+            for column in range(columns):
+                for row in range(rows):
+                    tile = tiled.tile(level, column, row)
+                    expected = whole.crop(tiled.tile_box(level, column, row))
+                    assert ImageChops.difference(tile, expected).getbbox() is None
+
+
+def test_compressed_files_keep_the_decoded_level(tmp_path):
+    path = str(tmp_path / "image.png")
+    noise_image((300, 170)).save(path)
+    cache = TileCache()
+    tiled = TiledImage(path, cache, tile_size=64)
+    tiles = tiled.load(0, [(0, 0), (4, 2)])
+    assert sorted(tiles) == [(0, 0), (4, 2)]
+    assert tiles[4, 2].size == (300 - 256, 170 - 128)
+    assert (path, 0, "level") in cache
+
+
+def test_render_tile_enlarges_only_the_box(tmp_path):
+    path = str(tmp_path / "image.png")
+    image = noise_image((300, 170))
+    image.save(path)
+    tiled = TiledImage(path, TileCache(), tile_size=64)
+    part = render_tile(tiled, 0, 1, 1, (128, 128), (16, 32, 32, 48))
+    assert part.size == (128, 128)
+    expected = image.crop((80, 96, 96, 112)).resize((128, 128), Image.NEAREST)
+    assert ImageChops.difference(part, expected).getbbox() is None
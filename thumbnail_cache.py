@@ -0,0 +1,190 @@
+from PIL import Image, ImageFile
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import re
+import sys
+import threading
+from engine import PollFolder, slot_resolution
+
+ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+
+# Folder used to keep the cache, following the convention of each system
+def user_cache_dir(app_name="image_vote"):
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~\\AppData\\Local"))
+        return os.path.join(base, app_name, "Cache")
+    if sys.platform == "darwin":
+        return os.path.join(os.path.expanduser("~/Library/Caches"), app_name)
+    base = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(base, app_name)
+
+
+# Persistent cache of resized images, so reopening a folder doesn't decode the originals again.
+# Every rendition is saved as "<file identity>_<width>x<height>.png", where the identity is a hash of the path, modification time and size of the original file.
+# The least recently used renditions are deleted when the cache is bigger than max_bytes
+class ThumbnailCache:
+    def __init__(self, cache_dir=None, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir or user_cache_dir()
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = None  # Rendition file name and [size in bytes, last use], loaded on first use
+        self.renditions = {}  # File identity and the set of resolutions cached for it
+        self.total_bytes = 0
+
+    # Read the renditions already in the cache folder
+    def load_entries(self):
+        self.entries = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for entry in os.scandir(self.cache_dir):
+            match = re.fullmatch(r"(\w+)_(\d+)x(\d+)\.png", entry.name)
+            if not match:
+                continue
+            stat = entry.stat()
+            self.entries[entry.name] = [stat.st_size, stat.st_mtime]
+            self.renditions.setdefault(match[1], set()).add(
+                (int(match[2]), int(match[3]))
+            )
+            self.total_bytes += stat.st_size
+
+    # Hash that changes whenever the original file is moved or modified
+    def identity(self, path):
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def rendition_name(self, identity, resolution):
+        return f"{identity}_{resolution[0]}x{resolution[1]}.png"
+
+    # Get a cached rendition of the image at the given resolution, or None if there is none.
+    # If only bigger renditions are cached, the closest one is resized down and saved
+    def get(self, path, resolution):
+        resolution = tuple(resolution)
+        identity = self.identity(path)
+        with self.lock:
+            if self.entries is None:
+                self.load_entries()
+            available = [
+                size
+                for size in self.renditions.get(identity, ())
+                if size[0] >= resolution[0] and size[1] >= resolution[1]
+            ]
+            if not available:
+                return None
+            closest = min(available, key=lambda size: size[0] * size[1])
+            name = self.rendition_name(identity, closest)
+            self.touch(name)
+        try:
+            with Image.open(os.path.join(self.cache_dir, name)) as img:
+                img.load()
+                if closest == resolution:
+                    return img
+                image = img.resize(resolution)
+        except OSError:
+            self.forget(identity, closest)
+            return None
+        self.save(identity, resolution, image)
+        return image
+
+    # Save a rendition of the image at the given resolution
+    def put(self, path, image):
+        self.save(self.identity(path), image.size, image)
+
+    def save(self, identity, resolution, image):
+        name = self.rendition_name(identity, resolution)
+        temp_path = os.path.join(self.cache_dir, f"{name}.{threading.get_ident()}.tmp")
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            image.save(temp_path, format="PNG", compress_level=1)
+            os.replace(temp_path, os.path.join(self.cache_dir, name))
+        except (OSError, ValueError):
+            # The cache is only an optimization, images that can't be saved as PNG are skipped
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        with self.lock:
+            if self.entries is None:
+                self.load_entries()
+            if name in self.entries:
+                self.total_bytes -= self.entries[name][0]
+            size = os.path.getsize(os.path.join(self.cache_dir, name))
+            self.entries[name] = [size, 0]
+            self.renditions.setdefault(identity, set()).add(tuple(resolution))
+            self.total_bytes += size
+            self.touch(name)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    # Mark a rendition as used now. Needs self.lock
+    def touch(self, name):
+        try:
+            os.utime(os.path.join(self.cache_dir, name))
+            self.entries[name][1] = os.path.getmtime(os.path.join(self.cache_dir, name))
+        except OSError:
+            pass
+
+    # Delete the least recently used renditions until the cache is 90% of max_bytes. Needs self.lock
+    def evict(self):
+        for name, (size, _) in sorted(self.entries.items(), key=lambda item: item[1][1]):
+            if self.total_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            identity, resolution = name[:-4].split("_")
+            self.renditions[identity].discard(tuple(map(int, resolution.split("x"))))
+            del self.entries[name]
+            self.total_bytes -= size
+
+    # Remove a rendition that couldn't be read
+    def forget(self, identity, resolution):
+        name = self.rendition_name(identity, resolution)
+        with self.lock:
+            self.renditions.get(identity, set()).discard(resolution)
+            if name in self.entries:
+                self.total_bytes -= self.entries.pop(name)[0]
+        try:
+            os.remove(os.path.join(self.cache_dir, name))
+        except OSError:
+            pass
+
+    # Get the image resized to the resolution, decoding the original only if it isn't cached
+    def load_resized(self, path, resolution):
+        image = self.get(path, resolution)
+        if image is None:
+            with Image.open(path) as img:
+                # Let JPEG files decode only at the size needed
+                img.draft(None, tuple(resolution))
+                image = img.resize(tuple(resolution))
+            self.put(path, image)
+        return image
+
+    # Resize every image of a renamed folder or poll definition ahead of a session, at the biggest slot size a screen of the given size can show.
+    # Smaller slots are later served by resizing these renditions instead of the originals. Returns the resolution and the files that couldn't be resized, with their error
+    def prewarm(self, folder, screen_size=(1920, 1080), workers=4, progress=None):
+        poll_folder = PollFolder(folder)
+        if not poll_folder.valid():
+            raise ValueError("\n".join(poll_folder.problems()))
+        paths = [os.path.join(folder, filename) for filename in poll_folder.filenames]
+        # The poll takes the aspect ratio from the first image of the first level
+        with Image.open(paths[0]) as img:
+            base_resolution = img.size
+        resolution = slot_resolution(
+            screen_size[0], screen_size[1], poll_folder.variant_count, base_resolution
+        )
+
+        failures = {}
+
+        def load(path):
+            try:
+                self.load_resized(path, resolution)
+            except Exception as e:
+                failures[path] = str(e) or type(e).__name__
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for count, _ in enumerate(executor.map(load, paths)):
+                if progress:
+                    progress(count + 1, len(paths))
+        return resolution, failures
@@ -0,0 +1,280 @@
+from PIL import Image
+from collections import OrderedDict
+import math
+import threading
+from residency import image_cost
+from tracing import traced
+
+
+# Tiles of the zoomed images, kept under a memory budget. When the budget is exceeded, the least recently used tiles are dropped.
+# Shared by every image, so zooming into many images doesn't use more memory than zooming into one
+class TileCache:
+    def __init__(self, budget_bytes=256 * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self.tiles = OrderedDict()  # (image path, level, column, row), or (image path, level, "level") for a whole decoded level, and its image, from the least to the most recently used
+        self.total_bytes = 0  # Bytes used by the tiles
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+            return tile
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.tiles
+
+    # Add a tile and drop the least recently used ones until the cache is under the budget
+    def put(self, key, tile):
+        with self.lock:
+            if key in self.tiles:
+                self.total_bytes -= image_cost(self.tiles.pop(key))
+            self.tiles[key] = tile
+            self.total_bytes += image_cost(tile)
+            while self.total_bytes > self.budget_bytes and len(self.tiles) > 1:
+                _, dropped = self.tiles.popitem(last=False)
+                self.total_bytes -= image_cost(dropped)
+
+
+# Strips or tiles of a file whose pixels are stored without compression (TIFF without compression, BMP, PPM), as (box, offset, rawmode, stride, orientation).
+# None for the other files, which Pillow can only decode whole
+def raw_tiles(image):
+    if image.mode in ("1", "P", "PA") or not image.tile:
+        return None
+    tiles = []
+    for decoder, box, offset, args in (tuple(tile)[:4] for tile in image.tile):
+        if decoder != "raw":
+            return None
+        if isinstance(args, str):
+            args = (args,)
+        rawmode = args[0]
+        stride = args[1] if len(args) > 1 else 0
+        orientation = args[2] if len(args) > 2 else 1
+        if not stride:
+            try:
+                stride = len(Image.new(image.mode, (box[2] - box[0], 1)).tobytes("raw", rawmode))
+            except (ValueError, OSError):
+                return None
+        tiles.append((box, offset, rawmode, stride, orientation))
+    # Separate planes of the same pixels can't be pasted one after the other
+    if len({box for box, *_ in tiles}) != len(tiles):
+        return None
+    return tiles
+
+
+# Read only the rows of the strips or tiles of a file without compression that intersect a box of the original, in bands of at most band_bytes
+def read_raw_region(path, mode, tiles, box, band_bytes=16 * 1024 * 1024):
+    region = Image.new(mode, (box[2] - box[0], box[3] - box[1]))
+    with open(path, "rb") as file:
+        for (left, top, right, bottom), offset, rawmode, stride, orientation in tiles:
+            first_row, last_row = max(top, box[1]), min(bottom, box[3])
+            first_column, last_column = max(left, box[0]), min(right, box[2])
+            if first_row >= last_row or first_column >= last_column:
+                continue
+            band_rows = max(band_bytes // stride, 1)
+            for band_top in range(first_row, last_row, band_rows):
+                band_bottom = min(band_top + band_rows, last_row)
+                # Files stored from the bottom row up (BMP) have the last rows first
+                if orientation < 0:
+                    file.seek(offset + (bottom - band_bottom) * stride)
+                else:
+                    file.seek(offset + (band_top - top) * stride)
+                data = file.read((band_bottom - band_top) * stride)
+                band = Image.frombuffer(
+                    mode, (right - left, band_bottom - band_top), data, "raw", rawmode, stride, orientation
+                )
+                region.paste(
+                    band.crop((first_column - left, 0, last_column - left, band.height)),
+                    (first_column - box[0], band_top - box[1]),
+                )
+    return region
+
+
+# Shrink an image by a whole factor, like the levels are
+def reduce_image(image, factor):
+    try:
+        return image.reduce(factor)
+    except ValueError:
+        # Some modes (like palette images) can't be reduced directly
+        return image.convert("RGBA").reduce(factor)
+
+
+# An image cut into square tiles at every level of detail, where each level has half the size of the previous one and the last one fits in one tile.
+# Files without compression are read only around the missing tiles. Pillow can't decode only a region of the other formats, so their level is decoded whole at its own size (JPEG files with draft, which skips most of the work for the smaller levels) and kept in the TileCache while it takes at most half of it, so the next tiles are cut from it.
+# The tiles are kept in the TileCache, so the memory used by the zoom doesn't grow with the number of zoomed images
+class TiledImage:
+    def __init__(self, path, cache, tile_size=512, full_size=None):
+        self.path = path
+        self.cache = cache  # TileCache with the decoded tiles
+        self.tile_size = tile_size
+        if full_size is None:
+            with Image.open(path) as image:
+                full_size = image.size
+        self.full_size = full_size  # Size of the original, the level 0
+        self.level_count = 1 + max(math.ceil(math.log2(max(full_size) / tile_size)), 0)
+        self.lock = threading.Lock()  # Only one level is decoded at a time, so the same level isn't decoded twice
+        self.layout = None  # Mode and raw_tiles of the file, read on the first load
+
+    # Size of a level, rounded up like Image.reduce and the JPEG draft do
+    def level_size(self, level):
+        factor = 2**level
+        return (-(-self.full_size[0] // factor), -(-self.full_size[1] // factor))
+
+    # Smallest level that still has at least one pixel for each pixel of the screen at the given zoom (pixels of the screen for each pixel of the original)
+    def level_for(self, scale):
+        if scale >= 1:
+            return 0
+        return min(int(math.log2(1 / scale)), self.level_count - 1)
+
+    # Number of columns and rows of tiles of a level
+    def grid(self, level):
+        width, height = self.level_size(level)
+        return -(-width // self.tile_size), -(-height // self.tile_size)
+
+    # Pixels of the level covered by a tile, as (left, top, right, bottom)
+    def tile_box(self, level, column, row):
+        width, height = self.level_size(level)
+        return (
+            column * self.tile_size,
+            row * self.tile_size,
+            min((column + 1) * self.tile_size, width),
+            min((row + 1) * self.tile_size, height),
+        )
+
+    def key(self, level, column, row):
+        return (self.path, level, column, row)
+
+    # Decode the whole original at the size of a level
+    @traced("decode_level", lambda self, level: {"file": self.path, "level": level, "source_size": self.full_size})
+    def decode(self, level):
+        size = self.level_size(level)
+        with Image.open(self.path) as image:
+            if level and image.format == "JPEG":
+                image.draft(None, size)
+            image.load()
+        factor = -(-image.width // size[0])  # Rounded up like the level sizes, so odd sizes aren't reduced by one less
+        if factor >= 2:
+            image = reduce_image(image, factor)
+        if image.size != size:
+            image = image.resize(size)
+        return image
+
+    # Decode only a box of a level from a file without compression, reading the rows of the original it covers in bands
+    @traced("decode_region", lambda self, level, box: {"file": self.path, "level": level, "box": box})
+    def decode_region(self, level, box):
+        mode, tiles = self.layout
+        factor = 2**level
+        full_box = (
+            box[0] * factor,
+            box[1] * factor,
+            min(box[2] * factor, self.full_size[0]),
+            min(box[3] * factor, self.full_size[1]),
+        )
+        if factor == 1:
+            return read_raw_region(self.path, mode, tiles, full_box)
+        # Rows of the original read and reduced at a time, a multiple of the factor so the bands line up with the level
+        band_rows = factor * max((16 * 1024 * 1024) // ((full_box[2] - full_box[0]) * 4 * factor), 1)
+        region = None
+        for top in range(full_box[1], full_box[3], band_rows):
+            band = reduce_image(
+                read_raw_region(
+                    self.path, mode, tiles, (full_box[0], top, full_box[2], min(top + band_rows, full_box[3]))
+                ),
+                factor,
+            )
+            if region is None:
+                region = Image.new(band.mode, (box[2] - box[0], box[3] - box[1]))
+            region.paste(band, (0, (top - full_box[1]) // factor))
+        return region
+
+    # The whole level, kept in the TileCache while it takes at most half of it so the next missing tiles are cut without decoding it again
+    def decoded_level(self, level):
+        key = (self.path, level, "level")
+        source = self.cache.get(key)
+        if source is None:
+            source = self.decode(level)
+            if image_cost(source) <= self.cache.budget_bytes // 2:
+                self.cache.put(key, source)
+        return source
+
+    # Cut the tiles of a level that are not in the cache yet. Returns every wanted tile.
+    # Files without compression are read only in the box of the missing tiles and the ring of tiles around it.
+    # The other files decode the level once for all of them, and when it is too big to keep, the tiles nearest to the first wanted one are also cut while they take less than half of the cache
+    @traced("load_tiles", lambda self, level, wanted: {"file": self.path, "level": level, "tiles": len(wanted)})
+    def load(self, level, wanted):
+        with self.lock:
+            tiles = {}
+            missing = []
+            for tile in wanted:
+                image = self.cache.get(self.key(level, *tile))
+                if image is None:
+                    missing.append(tile)
+                else:
+                    tiles[tile] = image
+            if not missing:
+                return tiles
+            if self.layout is None:
+                with Image.open(self.path) as image:
+                    self.layout = (image.mode, raw_tiles(image))
+            columns, rows = self.grid(level)
+            if self.layout[1] is not None:
+                first_column = max(min(column for column, _ in missing) - 1, 0)
+                first_row = max(min(row for _, row in missing) - 1, 0)
+                last_column = min(max(column for column, _ in missing) + 1, columns - 1)
+                last_row = min(max(row for _, row in missing) + 1, rows - 1)
+                box = (
+                    self.tile_box(level, first_column, first_row)[:2]
+                    + self.tile_box(level, last_column, last_row)[2:]
+                )
+                source = self.decode_region(level, box)
+                for column in range(first_column, last_column + 1):
+                    for row in range(first_row, last_row + 1):
+                        left, top, right, bottom = self.tile_box(level, column, row)
+                        image = source.crop((left - box[0], top - box[1], right - box[0], bottom - box[1]))
+                        if (column, row) in missing:
+                            tiles[column, row] = image
+                        self.cache.put(self.key(level, column, row), image)
+                return tiles
+            kept = (self.path, level, "level") in self.cache
+            source = self.decoded_level(level)
+            for tile in missing:
+                tiles[tile] = source.crop(self.tile_box(level, *tile))
+                self.cache.put(self.key(level, *tile), tiles[tile])
+            if kept or (self.path, level, "level") in self.cache:
+                return tiles
+            first_column, first_row = missing[0]
+            nearby = sorted(
+                ((column, row) for column in range(columns) for row in range(rows)),
+                key=lambda tile: max(abs(tile[0] - first_column), abs(tile[1] - first_row)),
+            )
+            spent = 0
+            for tile in nearby:
+                if spent >= self.cache.budget_bytes // 2:
+                    break
+                if tile in tiles or self.key(level, *tile) in self.cache:
+                    continue
+                image = source.crop(self.tile_box(level, *tile))
+                self.cache.put(self.key(level, *tile), image)
+                spent += image_cost(image)
+            return tiles
+
+    # Get a tile from the cache, cutting it if needed
+    def tile(self, level, column, row):
+        tile = self.cache.get(self.key(level, column, row))
+        if tile is None:
+            tile = self.load(level, [(column, row)])[column, row]
+        return tile
+
+
+# Resize a tile, or the box of it given as (left, top, right, bottom), to its size on the screen. Only uses PIL, so it runs on the tile workers.
+# Past one pixel of the screen for each pixel of the original the pixels are enlarged with nearest neighbour, so they can be seen as they are
+@traced("render_tile", lambda tiled, level, column, row, size, box=None: {"file": tiled.path, "level": level, "size": size, "box": box})
+def render_tile(tiled, level, column, row, size, box=None):
+    tile = tiled.tile(level, column, row)
+    if box is not None:
+        tile = tile.crop(box)
+    if tile.size == size:
+        return tile
+    return tile.resize(size, Image.NEAREST if size[0] > tile.width else Image.BILINEAR)
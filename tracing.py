@@ -0,0 +1,156 @@
+from collections import deque
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+
+# Records how long the hot paths take and saves them as a Chrome trace (open with chrome://tracing or https://ui.perfetto.dev).
+# It is disabled unless the IMAGE_VOTE_TRACE environment variable or the --trace flag give the file to save to
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.path = None  # File the trace is saved to when the program exits
+        self.events = []  # Chrome trace events
+        self.thread_names = {}  # Thread id and its name
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter_ns()
+
+    # Start recording and save the trace to the file when the program exits
+    def enable(self, path):
+        if not self.enabled:
+            atexit.register(self.save)
+        self.enabled = True
+        self.path = path
+
+    # Microseconds since the tracer was created, the time unit of Chrome traces
+    def now(self):
+        return (time.perf_counter_ns() - self.start_time) / 1000
+
+    # Add a span that started at start_time (from self.now) and ends now
+    def record(self, name, start_time, args=None):
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": start_time,
+            "dur": self.now() - start_time,
+            "pid": os.getpid(),
+            "tid": thread.ident,
+            "args": args or {},
+        }
+        with self.lock:
+            self.events.append(event)
+            self.thread_names[thread.ident] = thread.name
+
+    # Add a value to a counter track, like a latency
+    def counter(self, name, value):
+        event = {
+            "name": name,
+            "ph": "C",
+            "ts": self.now(),
+            "pid": os.getpid(),
+            "args": {name: value},
+        }
+        with self.lock:
+            self.events.append(event)
+
+    # Context manager recording the time of a block
+    def span(self, name, **args):
+        return Span(self, name, args)
+
+    # Events in the Chrome trace format, with the names of the threads
+    def trace(self):
+        with self.lock:
+            metadata = [
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": os.getpid(),
+                    "tid": ident,
+                    "args": {"name": name},
+                }
+                for ident, name in self.thread_names.items()
+            ]
+            return {"traceEvents": metadata + list(self.events), "displayTimeUnit": "ms"}
+
+    # Write the trace to the file
+    def save(self, path=None):
+        path = path or self.path
+        if path:
+            with open(path, "w") as file:
+                json.dump(self.trace(), file)
+
+
+# Block recorded by Tracer.span
+class Span:
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        if self.tracer.enabled:
+            self.start_time = self.tracer.now()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.tracer.enabled:
+            self.tracer.record(self.name, self.start_time, self.args)
+
+
+# Keeps the latest samples of a latency in seconds, so they can be read while the program runs
+class LatencyStats:
+    def __init__(self, name, max_samples=1000):
+        self.name = name
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0  # Number of samples since the start, including the discarded ones
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        if tracer.enabled:
+            tracer.counter(self.name, seconds * 1000)
+
+    # Mean, 95th percentile and maximum of the kept samples, in milliseconds
+    def summary(self):
+        if not self.samples:
+            return {"count": self.count, "mean_ms": 0, "p95_ms": 0, "max_ms": 0}
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "mean_ms": sum(ordered) / len(ordered) * 1000,
+            "p95_ms": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000,
+            "max_ms": ordered[-1] * 1000,
+        }
+
+
+tracer = Tracer()
+if os.environ.get("IMAGE_VOTE_TRACE"):
+    tracer.enable(os.environ["IMAGE_VOTE_TRACE"])
+
+
+# Decorator that records every call of a function. args receives the same arguments as the function and returns extra information for the span, like image sizes.
+# When tracing is disabled it only costs one attribute check per call
+def traced(name, args=None):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*function_args, **function_kwargs):
+            if not tracer.enabled:
+                return function(*function_args, **function_kwargs)
+            start_time = tracer.now()
+            try:
+                return function(*function_args, **function_kwargs)
+            finally:
+                # Arguments that can't be read, like a size only set by the function that failed, must not replace its exception
+                try:
+                    span_args = args(*function_args, **function_kwargs) if args else None
+                except Exception:
+                    span_args = None
+                tracer.record(name, start_time, span_args)
+
+        return wrapper
+
+    return decorator